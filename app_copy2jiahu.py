@@ -1,42 +1,80 @@
 import os
+import ast
 import time
-from io import StringIO
+import hashlib
+import threading
+import zipfile
+import gzip
+import json
+import tempfile
+import uuid
+import weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
+from io import StringIO, TextIOWrapper
 from io import BytesIO  # 导入内存文件流模块
+from xml.etree import ElementTree
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 # 在文件顶部添加导入
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from streamlit_echarts import st_echarts
 
+# 可选依赖：Rust实现的Excel解析器（pip install python-calamine），未安装时回退到openpyxl
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+# 可选依赖：列式数据集存储（pip install pyarrow），未安装时数据保存在内存中
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+except ImportError:
+    pa = None
+
+# 可选依赖：样条插值填充缺失值（pip install scipy）
+try:
+    import scipy.interpolate as scipy_interpolate
+except ImportError:
+    scipy_interpolate = None
+
 
 # =======预设图表配置==========================
 CHART_CONFIG = {
     # 1.对外贸易指标组
     "进出口总额及分项（出口 / 进口）对比图": {
+        "group": "对外贸易",
         "type": "line",
         "columns": ["进出口总额", "出口总额", "进口总额"],
         "x_axis": "指标名称"
     },
     "高新技术产品出口与工业增加值的相关性": {
+        "group": "对外贸易",
         "type": "scatter",
         "columns": ["  其中：高新技术产品"],            # 数值列
         "x_axis": "  其中：工业增加值"            # 分类列
     },
     "高新技术出口占比": {
+        "group": "对外贸易",
         "type": "pie",
         "x_axis": "进出口总额",  # 总额列名
         "columns": ["  其中：高新技术产品"]  # 部分金额列名列表
     },
     # 2.外商投资指标组
     "外资：合同金额/实际使用的时间趋势": {
+        "group": "外商投资",
         "type": "line",
         "columns": ["实际使用外资金额","合同外资金额"],      
         "x_axis": "指标名称"            
     },
     "外资：合同金额/实际使用对比图": {
+        "group": "外商投资",
         "type": "grouped_bar",
         "columns": ["合同外资金额", "实际使用外资金额"],  # 每组一个柱子
         "line_columns": ["合同外资金额"],
@@ -47,65 +85,71 @@ CHART_CONFIG = {
         "bar_colors": ["#1f77b4", "#ff7f0e"]
     },
     "历年累计实际使用外资金额": {
+        "group": "外商投资",
         "type": "bar",
         "columns": ["实际使用外资金额"],  # 需要展示的数值列
         "x_axis": "指标名称"                     # X轴列名
     },
     "大企业在新增企业中的比例": {
+        "group": "外商投资",
         "type": "pie",
         "x_axis": "新增外商投资企业数",  # 总额列名
         "columns": ["  其中：投资额1000万美元及以上的企业数"]  # 部分金额列名列表
     },
     # 3. 经济产出指标组
     "地区生产总值及二三产业增加值趋势图": {
+        "group": "经济产出",
         "type": "line",
         "columns": ["地区生产总值", "  其中：第二产业增加值", "        第三产业增加值 "],      
         "x_axis": "指标名称"            
     },
     "第二三产业GDP占比趋势图": {
+        "group": "经济产出",
         "type": "pie",
         "x_axis": "地区生产总值",  # 总额列名
         "columns": ["  其中：第二产业增加值", "        第三产业增加值 "]  # 部分金额列名列表
     },
     "工业增加值 vs 能源消费量": {
+        "group": "经济产出",
         "type": "scatter",
         "columns": ["  其中：工业增加值"],            # 数值列
         "x_axis": "规模以上工业法人单位综合能源消费量"            # 分类列
     },
     # 4. 企业绩效指标组
     "‘四上’企业分行业营业收入对比图": {
+        "group": "企业绩效",
         "type": "bar",
         "columns": ["  其中：规模以上工业法人单位", "        有资质的建筑业企业", "        限额以上批零住餐企业","        房地产开发经营业企业","        规模以上服务业企业"],
         "x_axis": "指标名称"
     },
-    "各行业收入/工业总产值趋势图": {
-        "type": "line",
-        "columns": ["  其中：规模以上工业法人单位", "        有资质的建筑业企业", "        限额以上批零住餐企业","        房地产开发经营业企业","        规模以上服务业企业","规模以上工业总产值"],      
-        "x_axis": "指标名称"            
-    },
     "行业相关性热力图": {
+        "group": "企业绩效",
         "type": "correlation_heatmap",
         "x_axis": "地区生产总值",  # 时间列
         "columns": ["  其中：规模以上工业法人单位", "        有资质的建筑业企业", "        限额以上批零住餐企业","        房地产开发经营业企业","        规模以上服务业企业","规模以上工业总产值"],  # 需要展示的两个指标
         #"color_scale": "Viridis"  # 颜色方案
     },
     "外商投资/高新技术企业在总营业收入中的比例": {
+        "group": "企业绩效",
         "type": "pie",
         "x_axis": "“四上”企业营业收入",  # 总额列名
         "columns": ["  其中：外商投资企业", "  其中：高新技术企业"]  # 部分金额列名列表
     },
     #5. 投资与基础设施指标组
     "固定资产投资及基础设施投资趋势图": {
+        "group": "投资与基础设施",
         "type": "line",
         "columns": ["固定资产投资（不含农户）", "  其中：基础设施投资"],      
         "x_axis": "指标名称"            
     },
     "基础设施投资在固定资产投资中的比例": {
+        "group": "投资与基础设施",
         "type": "pie",
         "x_axis": "固定资产投资（不含农户）",  # 总额列名
         "columns": ["  其中：基础设施投资"]  # 部分金额列名列表
     },
     "固定资产投资 vs GDP": {
+        "group": "投资与基础设施",
         "type": "dual_axis_line",
         "columns": ["固定资产投资（不含农户）"],   # 左侧Y轴的数据列
         "right_columns": ["地区生产总值"],  # 右侧Y轴的数据列
@@ -115,17 +159,20 @@ CHART_CONFIG = {
     },
     # 6. 就业指标组
     "“四上”企业从业人数趋势图": {
+        "group": "就业",
         "type": "line",
         "columns": ["“四上”企业从业人员期末人数"],      
         "x_axis": "指标名称"            
     },
     # 7. 能源与环境指标组
     "各行业收入/工业总产值趋势图": {
+        "group": "能源与环境",
         "type": "line",
         "columns": ["  其中：规模以上工业法人单位", "        有资质的建筑业企业", "        限额以上批零住餐企业","        房地产开发经营业企业","        规模以上服务业企业","规模以上工业总产值"],      
         "x_axis": "指标名称"            
     },
     "能源消费 vs 工业总产值": {
+        "group": "能源与环境",
         "type": "scatter",
         "columns": ["规模以上工业总产值"],            # 数值列
         "x_axis": "规模以上工业法人单位综合能源消费量"            # 分类列
@@ -133,61 +180,891 @@ CHART_CONFIG = {
 
     # 8. 财政指标组
     "税收增长趋势图": {
+        "group": "财政",
         "type": "line",
         "columns": ["税收收入"],      
         "x_axis": "指标名称"            
     },
     "税收收入 vs GDP": {
+        "group": "财政",
         "type": "scatter",
         "columns": ["税收收入"],            # 数值列
         "x_axis": "地区生产总值"            # 分类列
     },
     # 9. 企业数量指标组
     "新增/期末企业数趋势对比": {
+        "group": "企业数量",
         "type": "line",
         "columns": ["新增内资企业数","期末实有企业" ],      
         "x_axis": "指标名称"            
     },
     "期末实有企业中高新技术、上市、“四上”企业的占比": {
+        "group": "企业数量",
         "type": "pie",
         "x_axis": "期末实有企业",  # 总额列名
         "columns": ["  其中：高新技术企业","  其中：上市企业","  其中：“四上”企业"]  # 部分金额列名列表
     },
     # 10. 创新指标组
     "研发机构数和专利授权量": {
+        "group": "创新",
         "type": "line",
         "columns": ["期末研发机构数", "期末研发机构数"],
         "x_axis": "指标名称"
     },
     "固定资产投资（不含农户）规模图": {
+        "group": "创新",
         "type": "bar",
         "columns": ["固定资产投资（不含农户）"],
         "x_axis": "指标名称"
     },
     "发明专利占比": {
+        "group": "创新",
         "type": "pie",
         "x_axis": "当年专利授权量",  # 总额列名
         "columns": ["  其中：发明专利"]  # 部分金额列名列表
     },
     "专利授权量 vs 高新技术企业数": {
+        "group": "创新",
         "type": "scatter",
         "columns": ["当年专利授权量"],            # 数值列
         "x_axis": "  其中：高新技术企业"            # 分类列
     },
 }
 
+# =======预设图表编译==========================
+CHART_SCHEMA_CACHE_MAX_ENTRIES = 32     # 缓存的数据表结构（列名组合）数
+
+def normalize_column_name(name):
+    """列名去掉首尾空白后比较（月报中的"  其中：…"等缩进列名）"""
+    return str(name).strip()
+
+# 编译后的预设图表：类型、分组和所需列（规范化列名）
+class ChartSpec:
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.type = config["type"]
+        self.group = config["group"]
+        # 配置中引用列的字段，按字段保存规范化后的列名
+        self.fields = {
+            field: [normalize_column_name(col) for col in config[field]] if isinstance(config[field], list)
+            else normalize_column_name(config[field])
+            for field in ("x_axis", "columns", "right_columns", "line_columns") if field in config
+        }
+        # 图表所需的全部列（去重，保持顺序）
+        required = [self.fields["x_axis"]] + self.fields["columns"] + self.fields.get("right_columns", [])
+        self.required = list(dict.fromkeys(required))
+
+    def bind(self, column_map):
+        """把配置中的列名换成数据中的实际列名"""
+        config = dict(self.config)
+        for field, value in self.fields.items():
+            config[field] = [column_map.get(col, col) for col in value] if isinstance(value, list) \
+                else column_map.get(value, value)
+        return config
+
+# 一种数据表结构下各预设图表的可用情况
+class ChartSchema:
+    def __init__(self, valid, missing):
+        self.valid = valid      # 图表名 -> 换成实际列名的配置
+        self.missing = missing      # 图表名 -> 缺少的列
+
+# 预设图表目录：启动时编译全部配置，建立 列名 -> 依赖该列的图表 的索引，
+# 每种数据表结构只解析一次（按列名指纹缓存）
+class ChartCatalog:
+    def __init__(self, chart_config, max_entries=CHART_SCHEMA_CACHE_MAX_ENTRIES):
+        self.specs = {name: ChartSpec(name, config) for name, config in chart_config.items()}
+        self.groups = {}        # 指标组 -> 图表名列表（按配置顺序）
+        self.column_index = {}      # 规范化列名 -> 依赖该列的图表名列表
+        for spec in self.specs.values():
+            self.groups.setdefault(spec.group, []).append(spec.name)
+            for col in spec.required:
+                self.column_index.setdefault(col, []).append(spec.name)
+        self.max_entries = max_entries
+        self._schemas = OrderedDict()       # 列名指纹 -> ChartSchema
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(columns):
+        return hashlib.sha256("\x1f".join(map(str, columns)).encode('utf-8')).hexdigest()
+
+    def resolve(self, columns):
+        """返回该组列名下的图表可用情况，相同的列名组合只解析一次"""
+        key = ChartCatalog.fingerprint(columns)
+        with self._lock:
+            schema = self._schemas.get(key)
+            if schema is not None:
+                self._schemas.move_to_end(key)
+                return schema
+
+        # 规范化后重名的列以第一列为准
+        column_map = {}
+        for col in columns:
+            column_map.setdefault(normalize_column_name(col), col)
+        # 只有数据中缺少的列需要查索引
+        missing = {}
+        for col, chart_names in self.column_index.items():
+            if col not in column_map:
+                for chart_name in chart_names:
+                    missing.setdefault(chart_name, []).append(col)
+        valid = {
+            name: spec.bind(column_map) for name, spec in self.specs.items() if name not in missing
+        }
+        schema = ChartSchema(valid, {name: missing[name] for name in self.specs if name in missing})
+
+        with self._lock:
+            self._schemas[key] = schema
+            while len(self._schemas) > self.max_entries:
+                self._schemas.popitem(last=False)
+        return schema
+
+# 图表配置只编译一次，页面重新运行和各会话共用同一个目录（及其列匹配缓存）
+@st.cache_resource
+def get_chart_catalog():
+    return ChartCatalog(CHART_CONFIG)
+
+# =======解析缓存配置==========================
+PARSE_CACHE_MAX_BYTES = 1024 * 1024 * 1024      # 解析缓存上限（按DataFrame内存占用计，默认1GB）
+STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024      # 超过该大小的CSV默认分块流式读取
+CSV_CHUNK_ROWS = 50000      # 流式读取时每块的行数
+CSV_METADATA_SCAN_ROWS = 10     # 在表头后的前几行中查找元数据行（计量单位、代码）
+COMPACT_CATEGORY_RATIO = 0.5        # 文本列唯一值占比不超过该比例时转为分类类型
+DATASET_STORE_DIR = os.path.join(tempfile.gettempdir(), "lsapp_datasets")      # 列式数据集文件目录
+DATASET_STORE_MAX_BYTES = 10 * 1024 * 1024 * 1024       # 数据集文件总大小上限，超出时删除最早的文件
+DATASET_STORE_FORMAT_VERSION = 2        # 解析逻辑或文件格式改变时加1，服务重启后不再复用旧版本写入的文件
+DEFAULT_IMPORT_OPTIONS = {"compact": True}      # 导入页面的默认解析参数，配方未指定时批量清洗也按此导入
+RECIPE_IMPORT_OPTIONS = ("compact", "streaming", "sheet_name")      # 保存到清洗配方中的解析参数
+
+# 通用LRU缓存：各条目的大小由sizeof计算（默认每个条目计1，即按条目数淘汰），总大小超过上限时淘汰最久未使用的条目
+class LRUCache:
+    def __init__(self, max_size, sizeof=None):
+        self.max_size = max_size
+        self.total_size = 0     # 当前各条目大小之和
+        self.hits = 0       # 命中次数
+        self.misses = 0     # 未命中次数
+        self._sizeof = sizeof or (lambda value: 1)
+        self._entries = OrderedDict()       # key -> (value, size)，按最近使用排序
+        self._lock = threading.Lock()       # 各会话运行在不同线程中，需要加锁
+
+    def get(self, key):
+        """查找缓存，命中时移到LRU队尾"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """写入缓存，超过上限时淘汰最久未使用的条目"""
+        size = self._sizeof(value)
+        if size > self.max_size:
+            return      # 单个结果超过上限时不缓存
+        with self._lock:
+            if key in self._entries:
+                self.total_size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.total_size += size
+            while self.total_size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_size -= evicted_size
+
+    def stats(self):
+        """返回命中/未命中次数及占用信息"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "total_size": self.total_size,
+                "max_size": self.max_size
+            }
+
+# 解析结果缓存：按上传内容哈希+解析参数缓存DataFrame，按内存占用（字节）淘汰，整个服务进程共享
+class ParseCache(LRUCache):
+    def __init__(self, max_bytes=PARSE_CACHE_MAX_BYTES):
+        super().__init__(max_bytes, sizeof=lambda df: int(df.memory_usage(deep=True).sum()))
+
+    @staticmethod
+    def make_key(content_hash, file_ext, options):
+        """由内容哈希、文件扩展名和解析参数生成缓存键"""
+        return (content_hash, file_ext, tuple(sorted(options.items())))
+
+# 整个服务进程只创建一个解析缓存
+@st.cache_resource
+def get_parse_cache():
+    return ParseCache()
+
+# Excel读取层：按后端读取工作表名和指定工作表
+class ExcelReader:
+    BACKENDS = ["calamine", "openpyxl"]     # 按优先级排列
+
+    @staticmethod
+    def available_backends():
+        """返回当前环境可用的读取后端"""
+        return [b for b in ExcelReader.BACKENDS if b != "calamine" or python_calamine is not None]
+
+    @staticmethod
+    def default_backend():
+        """优先使用最快的可用后端"""
+        return ExcelReader.available_backends()[0]
+
+    @staticmethod
+    def sheet_names(uploaded_file, backend=None):
+        """只读取工作簿目录，不解析单元格数据"""
+        backend = backend or ExcelReader.default_backend()
+        uploaded_file.seek(0)
+        try:
+            if backend == "calamine":
+                return python_calamine.CalamineWorkbook.from_filelike(uploaded_file).sheet_names
+            if uploaded_file.name.endswith('.xls'):
+                # openpyxl不支持旧版xls，交给pandas默认引擎
+                return list(pd.ExcelFile(uploaded_file).sheet_names)
+            # xlsx是zip包，工作表目录在xl/workbook.xml中；openpyxl只读模式仍会加载共享字符串和样式
+            with zipfile.ZipFile(uploaded_file) as archive:
+                root = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+            ns = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+            return [sheet.get("name") for sheet in root.iterfind("m:sheets/m:sheet", ns)]
+        finally:
+            uploaded_file.seek(0)
+
+    @staticmethod
+    def read_sheet(uploaded_file, sheet_name=0, backend=None):
+        """只解析指定的工作表"""
+        backend = backend or ExcelReader.default_backend()
+        engine = backend
+        if backend == "openpyxl" and uploaded_file.name.endswith('.xls'):
+            engine = None
+        uploaded_file.seek(0)
+        # 第一列的日期由PeriodParser统一解析，这里不再让pandas逐个猜测格式
+        return pd.read_excel(uploaded_file, sheet_name=sheet_name, engine=engine)
+
+# 指标名称时间解析：一次处理Excel日期序列号、“2023年05月”文本和ISO日期，结果为月度PeriodIndex
+class PeriodParser:
+    EXCEL_ORIGIN = '1899-12-30'     # 校正Excel的1900闰年错误
+    CN_MONTH_PATTERN = r'(\d{4})\s*年\s*(\d{1,2})\s*月'
+
+    @staticmethod
+    def to_datetime(values):
+        """把混合格式的时间列向量化地转为datetime64，无法识别的值为NaT"""
+        values = pd.Series(values)
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        if isinstance(values.dtype, pd.PeriodDtype):
+            return values.dt.to_timestamp()
+
+        # Excel日期序列号
+        serials = pd.to_numeric(values, errors='coerce')
+        result = pd.to_datetime(serials, unit='D', origin=PeriodParser.EXCEL_ORIGIN, errors='coerce')
+
+        # 其余非空值：先匹配“2023年05月”，剩下的按ISO日期解析
+        rest = serials.isna() & values.notna()
+        if rest.any():
+            text = values[rest].astype(str)
+            year_month = text.str.extract(PeriodParser.CN_MONTH_PATTERN)
+            cn_dates = pd.to_datetime(
+                year_month[0] + '-' + year_month[1].str.zfill(2) + '-01',
+                format='%Y-%m-%d', errors='coerce'
+            )
+            iso_rest = cn_dates.isna()
+            if iso_rest.any():
+                cn_dates[iso_rest] = pd.to_datetime(text[iso_rest], format='ISO8601', errors='coerce')
+            result[rest] = cn_dates
+        return result
+
+    @staticmethod
+    def from_datetime(dates, freq='M'):
+        """线性插补缺失的时间后截断到月份"""
+        dates = pd.Series(dates).interpolate(method='linear')
+        return pd.PeriodIndex(dates.dt.to_period(freq))
+
+    @staticmethod
+    def parse(values, freq='M'):
+        """返回与输入等长的月度PeriodIndex"""
+        return PeriodParser.from_datetime(PeriodParser.to_datetime(values), freq)
+
+# 列式存储中的一个数据集：按列从内存映射文件中读取，各会话共享同一个句柄
+class DatasetHandle:
+    def __init__(self, dataset_id, path):
+        self.dataset_id = dataset_id
+        self.path = path
+        self._columns = {}      # 已读取的列，列名 -> Series
+        self._frame = None      # 全部列读取后组装的DataFrame
+        self._lock = threading.Lock()
+
+        # 只读取文件头中的表结构
+        with pa.memory_map(path) as source:
+            reader = pa_ipc.open_file(source)
+            schema = reader.schema
+            self.num_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        self.columns = list(schema.names)
+        metadata = schema.metadata or {}
+        self.attrs = json.loads(metadata.get(b"lsapp_attrs", b"{}"))
+
+    @property
+    def shape(self):
+        return (self.num_rows, len(self.columns))
+
+    @property
+    def file_bytes(self):
+        return os.path.getsize(self.path)
+
+    def read(self, columns=None):
+        """读取指定的列（默认全部），已读取的列不再重复加载"""
+        columns = self.columns if columns is None else list(columns)
+        with self._lock:
+            missing = [col for col in columns if col not in self._columns]
+            if missing:
+                # 内存映射读取：无空值的数值列直接引用文件页，不复制到进程内存
+                table = pa_ipc.open_file(pa.memory_map(self.path)).read_all().select(missing)
+                loaded = table.to_pandas(split_blocks=True)
+                for col in missing:
+                    self._columns[col] = loaded[col]
+            df = pd.DataFrame({col: self._columns[col] for col in columns}, copy=False)
+        df.attrs = dict(self.attrs)
+        return df
+
+    def to_frame(self):
+        """返回全部列组成的只读DataFrame（只需行列数时使用shape和columns，不加载数据）"""
+        if self._frame is None:
+            self._frame = self.read()
+        return self._frame
+
+# 列式数据集存储：每个解析结果只写一次Arrow IPC文件，读取时使用内存映射
+class DatasetStore:
+    def __init__(self, root=DATASET_STORE_DIR, max_bytes=DATASET_STORE_MAX_BYTES):
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.max_bytes = max_bytes
+        # dataset_id -> DatasetHandle，只保留仍被会话引用的句柄，这些句柄的文件不会被删除
+        self._handles = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def dataset_id(key):
+        """由存储格式版本和解析缓存键生成文件名"""
+        return hashlib.sha256(repr((DATASET_STORE_FORMAT_VERSION, key)).encode('utf-8')).hexdigest()[:32]
+
+    def _path(self, dataset_id):
+        return os.path.join(self.root, f"{dataset_id}.arrow")
+
+    def get(self, dataset_id):
+        """返回已存储的数据集（服务重启后也能直接使用磁盘上的文件）"""
+        with self._lock:
+            handle = self._handles.get(dataset_id)
+            if handle is None and os.path.exists(self._path(dataset_id)):
+                handle = self._handles[dataset_id] = DatasetHandle(dataset_id, self._path(dataset_id))
+            return handle
+
+    def put(self, dataset_id, df):
+        """写入数据集文件（已存在时直接返回句柄）"""
+        with self._lock:
+            path = self._path(dataset_id)
+            if not os.path.exists(path):
+                table = DatasetStore._to_table(df)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with pa_ipc.new_file(tmp_path, table.schema) as writer:
+                    writer.write_table(table)
+                os.replace(tmp_path, path)
+                self._evict(keep=path)
+            handle = self._handles.get(dataset_id)
+            if handle is None:
+                handle = self._handles[dataset_id] = DatasetHandle(dataset_id, path)
+            return handle
+
+    @staticmethod
+    def _to_table(df):
+        """转换为Arrow表；浮点列的NaN保留为值而不是null，读取时才能零拷贝"""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        arrays = [
+            pa.array(df[col].to_numpy(), from_pandas=False) if pd.api.types.is_float_dtype(df[col])
+            else table.column(i)
+            for i, col in enumerate(df.columns)
+        ]
+        metadata = dict(table.schema.metadata or {})
+        metadata[b"lsapp_attrs"] = json.dumps(df.attrs).encode('utf-8')
+        return pa.Table.from_arrays(arrays, names=[str(col) for col in df.columns]).replace_schema_metadata(metadata)
+
+    def _evict(self, keep):
+        """文件总大小超过上限时删除最早写入的、没有会话在使用的文件"""
+        # 会话持有的句柄还会读取未加载的列和文件大小，文件必须保留
+        live = {handle.path for handle in list(self._handles.values())}
+        files = sorted(
+            (os.path.join(self.root, name) for name in os.listdir(self.root) if name.endswith(".arrow")),
+            key=os.path.getmtime
+        )
+        total = sum(os.path.getsize(path) for path in files)
+        for path in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep or path in live:
+                continue
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                total -= size
+            except OSError:
+                continue
+
+    def stats(self):
+        """返回正在使用的数据集数量和文件大小"""
+        with self._lock:
+            handles = list(self._handles.values())
+            return {
+                "datasets": len(handles),
+                "file_bytes": sum(handle.file_bytes for handle in handles)
+            }
+
+# 整个服务进程共享一个数据集存储（未安装pyarrow时为None）
+@st.cache_resource
+def get_dataset_store():
+    return DatasetStore() if pa is not None else None
+
+# 跨会话的共享数据集登记：统计每个数据集被多少个会话引用
+class SharedDatasetRegistry:
+    def __init__(self):
+        self._sessions = {}     # session_id -> dataset_id
+        self._dataset_bytes = {}        # dataset_id -> 数据集内存占用
+        self._lock = threading.Lock()
+
+    def attach(self, dataset_id, session_id, dataset_bytes):
+        """登记会话引用的数据集（每个会话同时只引用一个）"""
+        with self._lock:
+            self._sessions[session_id] = dataset_id
+            if dataset_id not in self._dataset_bytes:
+                self._dataset_bytes[dataset_id] = int(dataset_bytes)
+
+    def detach(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _prune(self):
+        """移除已关闭的会话"""
+        try:
+            from streamlit.runtime import Runtime
+            runtime = Runtime.instance()
+        except Exception:
+            return
+        for session_id in list(self._sessions):
+            if not runtime.is_active_session(session_id):
+                del self._sessions[session_id]
+
+    def stats(self, dataset_id):
+        """返回共享该数据集的会话数和相比各自保存副本节省的内存"""
+        with self._lock:
+            self._prune()
+            sessions = sum(1 for d in self._sessions.values() if d == dataset_id)
+            dataset_bytes = self._dataset_bytes.get(dataset_id, 0)
+            return {
+                "sessions": sessions,
+                "dataset_bytes": dataset_bytes,
+                "saved_bytes": max(sessions - 1, 0) * dataset_bytes
+            }
+
+# 整个服务进程只创建一个共享登记表
+@st.cache_resource
+def get_shared_registry():
+    return SharedDatasetRegistry()
+
+# 数据集概况：每行的哈希值和每列的空值位图，每个版本计算一次，
+# 之后的版本根据删除的行和填充的单元格增量更新，各页面的统计卡片直接读取
+class DatasetProfile:
+    def __init__(self, columns, row_hashes, null_bits, null_counts):
+        self.columns = list(columns)
+        self.row_hashes = row_hashes        # uint64数组，每行一个哈希值
+        self.null_bits = null_bits      # 按行打包的空值位图，形状为(ceil(行数/8), 列数)
+        self.null_counts = null_counts      # 各列空值数量（Series）
+        self._duplicate_count = None
+
+    @property
+    def num_rows(self):
+        return len(self.row_hashes)
+
+    @property
+    def missing_total(self):
+        return int(self.null_counts.sum())
+
+    @property
+    def duplicate_count(self):
+        """重复行数量（与df.duplicated().sum()相同，按行哈希计算）"""
+        if self._duplicate_count is None:
+            self._duplicate_count = self.num_rows - len(np.unique(self.row_hashes))
+        return self._duplicate_count
+
+    @property
+    def nbytes(self):
+        return self.row_hashes.nbytes + self.null_bits.nbytes
+
+    def null_mask(self):
+        """解包空值位图，返回(行数, 列数)的布尔数组"""
+        return np.unpackbits(self.null_bits, axis=0, count=self.num_rows).view(bool)
+
+    @staticmethod
+    def _from_parts(columns, row_hashes, null_mask):
+        return DatasetProfile(
+            columns, row_hashes, np.packbits(null_mask, axis=0),
+            pd.Series(null_mask.sum(axis=0), index=columns, dtype='int64')
+        )
+
+    @staticmethod
+    def from_frame(df):
+        """完整扫描一次数据"""
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        return DatasetProfile._from_parts(df.columns, row_hashes, df.isna().to_numpy())
+
+    def take(self, positions):
+        """按行位置取子集（如看板按时间范围筛选后的行）"""
+        return DatasetProfile._from_parts(self.columns, self.row_hashes[positions], self.null_mask()[positions])
+
+    def updated(self, version, df):
+        """根据version相对上一版本的变化更新，df为version的数据"""
+        if list(df.columns) != self.columns:
+            return DatasetProfile.from_frame(df)
+
+        row_hashes = self.row_hashes
+        null_mask = self.null_mask()
+        if version.row_mask is not None:
+            row_hashes = row_hashes[version.row_mask]
+            null_mask = null_mask[version.row_mask]
+
+        if version.column_updates:
+            # 整列替换（类型转换）后所有行的哈希值都会变化
+            row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+            for col in version.column_updates:
+                null_mask[:, self.columns.index(col)] = df[col].isna().to_numpy()
+        if version.cell_updates:
+            # 只重新计算被填充的单元格所在行的哈希值
+            changed_rows = np.unique(np.concatenate([positions for positions, _ in version.cell_updates.values()]))
+            for col, (positions, values) in version.cell_updates.items():
+                null_mask[positions, self.columns.index(col)] = pd.isna(values)
+            if not version.column_updates:
+                row_hashes = row_hashes.copy()
+                row_hashes[changed_rows] = pd.util.hash_pandas_object(
+                    df.iloc[changed_rows], index=False
+                ).to_numpy()
+        return DatasetProfile._from_parts(self.columns, row_hashes, null_mask)
+
+# 清洗数据的版本：除基础版本外，每个版本只记录相对上一版本的变化
+class DatasetVersion:
+    def __init__(self, parent=None, frame=None, row_mask=None, cell_updates=None,
+                 column_updates=None, label="", version_id=None, step=None, stats=None):
+        self.parent = parent
+        self.label = label      # 清洗步骤名称
+        self.version_id = version_id or uuid.uuid4().hex
+        self.step = step        # 产生本版本的清洗步骤（CleaningStep）
+        self.stats = stats or {}        # 清洗步骤的统计信息（删除行数、填充数量等）
+        if row_mask is not None and row_mask.all():
+            row_mask = None     # 没有删除任何行
+        self.row_mask = row_mask        # 布尔数组，长度为上一版本的行数，True表示保留
+        self.cell_updates = cell_updates or {}      # 列名 -> (行位置数组, 新值数组)
+        self.column_updates = column_updates or {}      # 列名 -> 整列替换后的Series（如类型转换）
+        self._frame = frame     # 基础版本保存原始数据，其余版本只在成为当前版本时缓存
+        self.undo_data = None       # 撤销本步所需的数据：被删除的行、被覆盖的单元格和列
+        self._profile = None        # 数据概况（DatasetProfile），首次使用时计算
+        self._dtypes = None     # 各列的数据类型，首次使用时取自数据
+        self.depth = 0 if parent is None else parent.depth + 1
+
+    @property
+    def is_base(self):
+        return self.parent is None
+
+    @property
+    def delta_bytes(self):
+        """本版本记录的变化所占的字节数"""
+        total = self.row_mask.nbytes if self.row_mask is not None else 0
+        for positions, values in self.cell_updates.values():
+            total += positions.nbytes + getattr(values, "nbytes", 0)
+        for series in self.column_updates.values():
+            total += int(series.memory_usage(index=False, deep=True))
+        return total
+
+    @property
+    def undo_bytes(self):
+        """撤销数据所占的字节数"""
+        if self.undo_data is None:
+            return 0
+        total = 0
+        if "dropped" in self.undo_data:
+            positions, rows = self.undo_data["dropped"]
+            total += positions.nbytes + int(rows.memory_usage(index=False, deep=True).sum())
+        for positions, values in self.undo_data["cells"].values():
+            total += positions.nbytes + values.nbytes
+        for series in self.undo_data["columns"].values():
+            total += int(series.memory_usage(index=False, deep=True))
+        return total
+
+    def record_undo(self, parent_df):
+        """根据上一版本的数据记录撤销本步所需的数据（只保存被删除或被覆盖的部分）"""
+        undo = {"cells": {}, "columns": {}}
+        kept = None
+        if self.row_mask is not None:
+            kept = np.flatnonzero(self.row_mask)
+            dropped = np.flatnonzero(~self.row_mask)
+            undo["dropped"] = (dropped, parent_df.iloc[dropped])
+        for col in self.column_updates:
+            column = parent_df[col] if kept is None else parent_df[col].iloc[kept]
+            undo["columns"][col] = column.reset_index(drop=True)
+        for col, (positions, _) in self.cell_updates.items():
+            if col in self.column_updates:
+                continue    # 整列恢复时已包含
+            parent_positions = positions if kept is None else kept[positions]
+            undo["cells"][col] = (positions, parent_df[col].iloc[parent_positions].array)
+        self.undo_data = undo
+
+    def revert(self, df):
+        """由本版本的数据恢复出上一版本的数据，不需要从基础版本重放"""
+        updates = {}
+        for col, (positions, values) in self.undo_data["cells"].items():
+            column = df[col].copy()
+            column.iloc[positions] = values
+            updates[col] = column
+        for col, series in self.undo_data["columns"].items():
+            updates[col] = series.set_axis(df.index)
+        if updates:
+            df = df.assign(**updates)
+
+        if "dropped" in self.undo_data:
+            # 把被删除的行插回原来的位置
+            positions, rows = self.undo_data["dropped"]
+            total = len(df) + len(positions)
+            order = np.empty(total, dtype=np.intp)
+            order[self.row_mask] = np.arange(len(df))
+            order[positions] = np.arange(len(df), total)
+            df = pd.concat([df, rows], ignore_index=True).take(order).reset_index(drop=True)
+        return df
+
+    def drop_undo(self):
+        """超出内存上限时丢弃撤销数据，撤销时改为从基础版本重放"""
+        self.undo_data = None
+
+    def apply_to(self, df):
+        """在上一版本的数据上应用本版本的变化，只复制保留的行和改动的列"""
+        if self.row_mask is not None:
+            df = df[self.row_mask].reset_index(drop=True)
+
+        updates = {}
+        for col, series in self.column_updates.items():
+            updates[col] = series.set_axis(df.index)
+        for col, (positions, values) in self.cell_updates.items():
+            column = updates.get(col, df[col]).copy()
+            column.iloc[positions] = values
+            updates[col] = column
+        if updates:
+            df = df.assign(**updates)
+        return df
+
+    def materialize(self):
+        """返回本版本的DataFrame：从最近的已缓存祖先开始依次应用变化"""
+        if self._frame is not None:
+            return self._frame
+
+        chain = []
+        node = self
+        while node._frame is None:
+            chain.append(node)
+            node = node.parent
+        df = node._frame
+        for version in reversed(chain):
+            df = version.apply_to(df)
+        self._frame = df
+        return df
+
+    @property
+    def profile(self):
+        """本版本的数据概况：上一版本已有概况时增量更新，否则完整扫描"""
+        if self._profile is None:
+            if self.parent is not None and self.parent._profile is not None:
+                self._profile = self.parent._profile.updated(self, self.materialize())
+            else:
+                self._profile = DatasetProfile.from_frame(self.materialize())
+        return self._profile
+
+    @property
+    def dtypes(self):
+        """各列的数据类型，释放数据后仍保留，页面重新运行时不需要重建数据"""
+        if self._dtypes is None:
+            self._dtypes = self.materialize().dtypes
+        return self._dtypes
+
+    def release(self, profile=False):
+        """不再是当前版本时释放缓存的数据（基础版本保留），profile为True时同时释放数据概况"""
+        if not self.is_base:
+            self._frame = None
+            if profile:
+                self._profile = None
+
+    def history(self):
+        """从基础版本到本版本的版本列表"""
+        chain = []
+        node = self
+        while node is not None:
+            chain.append(node)
+            node = node.parent
+        return list(reversed(chain))
+
 # 初始化全局状态
 class GlobalState:
     def __init__(self):
-        self.raw_df = None      # 存储原始数据（DataFrame）
-        self.cleaned_df = None      # 存储清洗后的数据
+        self.raw_handle = None      # 原始数据在列式存储中的句柄（安装pyarrow时使用）
+        self._raw_df = None     # 未使用列式存储时的原始数据（DataFrame）
+        self.raw_dataset_id = None      # 原始数据的内容指纹，相同文件的会话共享同一份数据
+        self._base_version = None       # 清洗的基础版本（引用共享的原始数据）
+        self.cleaned_version = None      # 清洗后数据的当前版本（DatasetVersion）
+        self.version_memo = OrderedDict()       # 清洗步骤结果缓存：版本ID -> DatasetVersion
+        self.redo_stack = []        # 已撤销的清洗步骤：(版本, 对应控件的取值)
+        self.import_options = {}        # 原始数据的解析参数，随清洗配方一起保存
         self.current_page = "数据导入"      # 当前页面标识符(默认 数据导入)
         self.file_uploaded = False      ## 文件上传状态标记
 
+    # 原始数据：有句柄时从共享的内存映射文件中读取
+    @property
+    def raw_df(self):
+        if self.raw_handle is not None:
+            return self.raw_handle.to_frame()
+        return self._raw_df
+
+    @raw_df.setter
+    def raw_df(self, df):
+        self._raw_df = df
+        self.raw_handle = None
+
+    def set_raw_handle(self, handle):
+        """改为引用列式存储中的数据集"""
+        self.raw_handle = handle
+        self._raw_df = None
+
+    # 以下属性只读取文件头中的表结构，不加载数据
+    @property
+    def has_raw_data(self):
+        return self.raw_handle is not None or self._raw_df is not None
+
+    @property
+    def raw_shape(self):
+        if self.raw_handle is not None:
+            return self.raw_handle.shape
+        return self._raw_df.shape if self._raw_df is not None else None
+
+    @property
+    def raw_bytes(self):
+        """原始数据的大小：列式存储按文件大小计"""
+        if self.raw_handle is not None:
+            return self.raw_handle.file_bytes
+        return int(self._raw_df.memory_usage(deep=True).sum()) if self._raw_df is not None else 0
+
+    def attach_dataset(self, dataset_id, import_options):
+        """登记当前会话使用的共享数据集，换了数据集时丢弃旧的清洗结果"""
+        if dataset_id != self.raw_dataset_id:
+            self.cleaned_df = None
+            self._base_version = None
+            self.version_memo.clear()
+            self.redo_stack.clear()
+        self.raw_dataset_id = dataset_id
+        # 未勾选压缩时也明确写入，批量清洗的默认值是压缩
+        self.import_options = {"compact": bool(import_options.get("compact"))}
+        self.import_options.update(
+            (key, import_options[key]) for key in RECIPE_IMPORT_OPTIONS if key in import_options
+        )
+        get_shared_registry().attach(dataset_id, DataUtils.session_id(), self.raw_bytes)
+
+    # 清洗后数据：当前版本的DataFrame
+    @property
+    def cleaned_df(self):
+        if self.cleaned_version is None:
+            return None
+        return self.cleaned_version.materialize()
+
+    @cleaned_df.setter
+    def cleaned_df(self, df):
+        self.cleaned_version = DatasetVersion(frame=df, label="原始数据") if df is not None else None
+
+    @property
+    def cleaned_shared(self):
+        """清洗后数据是否仍直接引用共享的原始数据"""
+        return self.cleaned_version is not None and self.cleaned_version.is_base
+
+    def base_cleaning_version(self):
+        """以共享的原始数据作为清洗的基础版本，不复制"""
+        raw_df = self.raw_df
+        if self._base_version is None or self._base_version.materialize() is not raw_df:
+            self._base_version = DatasetVersion(
+                frame=raw_df, label="原始数据", version_id=self.raw_dataset_id
+            )
+            self.version_memo.clear()
+            self.redo_stack.clear()
+        return self._base_version
+
+    def set_cleaned_version(self, version):
+        """设为当前版本，并释放缓存中其他版本的数据（只保留增量）"""
+        # 当前版本的各上一版本保留数据概况，供后续步骤增量更新
+        lineage = {node.version_id for node in version.history()}
+        for cached in self.version_memo.values():
+            if cached is not version:
+                cached.release(profile=cached.version_id not in lineage)
+        self.cleaned_version = version
+        # 清洗步骤有变化（不是撤销/重做产生的）时，已撤销的步骤不能再重做
+        if self.redo_stack and self.redo_stack[-1][0].parent.version_id != version.version_id:
+            self.redo_stack.clear()
+        self._limit_undo_bytes()
+
+    def _limit_undo_bytes(self):
+        """从最新的步骤开始保留撤销数据，超出上限的较早步骤丢弃撤销数据"""
+        # 只有当前版本的各步骤和可重做的步骤会用到撤销数据，缓存中的其他版本（预览、
+        # 改过参数的旧结果）直接丢弃，重新成为当前版本时从基础版本重放
+        kept = {node.version_id for node in self.cleaned_version.history()}
+        kept.update(version.version_id for version, _ in self.redo_stack)
+        for cached in self.version_memo.values():
+            if cached.version_id not in kept:
+                cached.drop_undo()
+        total = 0
+        for version in reversed(self.cleaned_version.history()[1:]):
+            total += version.undo_bytes
+            if total > UNDO_MAX_BYTES:
+                version.drop_undo()
+        for version, _ in self.redo_stack:
+            total += version.undo_bytes
+            if total > UNDO_MAX_BYTES:
+                version.drop_undo()
+
+    @property
+    def undo_bytes(self):
+        if self.cleaned_version is None:
+            return 0
+        return sum(version.undo_bytes for version in self.cleaned_version.history()[1:])
+
+    def undo_cleaning(self):
+        """撤销最后一步清洗，返回被撤销的版本"""
+        head = self.cleaned_version
+        if head is None or head.is_base:
+            return None
+        parent = head.parent
+        if parent._frame is None and head.undo_data is not None:
+            # 用撤销数据直接恢复上一版本，不需要另一份完整数据
+            parent._frame = head.revert(head.materialize())
+        parent.materialize()
+        head.release()
+        self.cleaned_version = parent
+        return head
+
+    def redo_cleaning(self, version):
+        """重做一个已撤销的版本"""
+        self.version_memo[version.version_id] = version
+        version.materialize()
+        version.parent.release()
+        self.cleaned_version = version
+
     #一键重置所有数据相关的状态，保持状态一致性。
     def reset_data(self):
+        if self.raw_dataset_id is not None:
+            get_shared_registry().detach(DataUtils.session_id())
         self.raw_df = None
+        self.raw_dataset_id = None
         self.cleaned_df = None
+        self._base_version = None
+        self.version_memo.clear()
+        self.redo_stack.clear()
+        self.import_options = {}
         self.file_uploaded = False
 
 # 创建全局状态
@@ -196,39 +1073,188 @@ def init_global_state():
         st.session_state.global_state = GlobalState()
     return st.session_state.global_state
 
+# 带文件名的内存文件，供子进程/命令行中复用上传文件的解析逻辑
+class NamedBytesIO(BytesIO):
+    def __init__(self, data, name):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+def parse_upload(name, data, options):
+    """解析一个文件，返回(DataFrame, 耗时)；模块级函数，可交给子进程执行（批量导入和batch_clean.py共用）"""
+    start = time.perf_counter()
+    df = DataUtils._parse_file(NamedBytesIO(data, name), **options)
+    return df, time.perf_counter() - start
+
 # 工具函数模块
 class DataUtils:
     @staticmethod
-    def load_data(uploaded_file):
+    def session_id():
+        """当前Streamlit会话的ID（脚本外运行时为None）"""
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        ctx = get_script_run_ctx()
+        return ctx.session_id if ctx is not None else None
+
+    @staticmethod
+    def file_fingerprint(uploaded_file):
+        """计算上传文件内容的哈希指纹（同一个上传文件在会话中只计算一次）"""
+        file_id = getattr(uploaded_file, "file_id", None)
+        if file_id is None or DataUtils.session_id() is None:
+            return hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        fingerprints = st.session_state.setdefault("file_fingerprints", {})     # file_id -> 指纹
+        if file_id not in fingerprints:
+            fingerprints[file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+        return fingerprints[file_id]
+
+    @staticmethod
+    def parse_key(uploaded_file, options):
+        """由文件内容和解析参数生成缓存键"""
+        file_ext = os.path.splitext(uploaded_file.name)[1].lower()
+        return ParseCache.make_key(DataUtils.file_fingerprint(uploaded_file), file_ext, options)
+
+    @staticmethod
+    def load_data(uploaded_file, progress_callback=None, cache_key=None, **options):
+        """读取上传文件，相同内容和参数的文件只解析一次（返回的DataFrame为缓存共享对象，不要原地修改）"""
+        cache = get_parse_cache()
+        key = cache_key or DataUtils.parse_key(uploaded_file, options)
+
+        df = cache.get(key)
+        if df is None:
+            df = DataUtils._parse_file(uploaded_file, progress_callback=progress_callback, **options)
+            if df is not None:
+                cache.put(key, df)
+        return df
+
+    @staticmethod
+    def load_dataset(uploaded_file, progress_callback=None, cache_key=None, **options):
+        """读取上传文件并写入列式存储，返回各会话共享的DatasetHandle（未安装pyarrow时返回None）"""
+        store = get_dataset_store()
+        if store is None:
+            return None
+
+        dataset_id = DatasetStore.dataset_id(cache_key or DataUtils.parse_key(uploaded_file, options))
+        handle = store.get(dataset_id)
+        if handle is None:
+            # 解析结果只用于写文件，之后各会话从内存映射中读取
+            df = DataUtils._parse_file(uploaded_file, progress_callback=progress_callback, **options)
+            if df is None:
+                return None
+            handle = store.put(dataset_id, df)
+        return handle
+
+    @staticmethod
+    def load_many(uploaded_files, progress_callback=None, cache_keys=None, **options):
+        """多进程并行解析多个文件，按指标名称对齐后合并，返回(合并结果, 每个文件的报告)"""
+        cache = get_parse_cache()
+        cache_keys = cache_keys or [DataUtils.parse_key(f, options) for f in uploaded_files]
+        # 报告中的文件名：同名文件（如不同区县的同名月报）加序号区分
+        labels = []
+        seen = {}
+        for uploaded_file in uploaded_files:
+            seen[uploaded_file.name] = seen.get(uploaded_file.name, 0) + 1
+            count = seen[uploaded_file.name]
+            labels.append(uploaded_file.name if count == 1 else f"{uploaded_file.name} ({count})")
+
+        frames = [None] * len(uploaded_files)       # 按上传顺序保存各文件的解析结果
+        report = {label: {} for label in labels}
+        pending = {}        # 文件序号 -> 缓存键
+
+        # 已缓存的文件直接复用，其余文件交给进程池
+        for i, (uploaded_file, key) in enumerate(zip(uploaded_files, cache_keys)):
+            frames[i] = cache.get(key)
+            if frames[i] is not None:
+                report[labels[i]].update({"耗时(秒)": 0.0, "来源": "缓存"})
+            else:
+                pending[i] = key
+
+        if pending:
+            # Streamlit服务进程是多线程的，fork出的子进程可能继承其他线程持有的锁（日志、线程池等），
+            # 因此用forkserver/spawn启动干净的子进程（子进程重新导入本模块，主程序入口有__main__保护）
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            with ProcessPoolExecutor(max_workers=min(len(pending), os.cpu_count() or 1), mp_context=context) as executor:
+                futures = {
+                    executor.submit(parse_upload, uploaded_files[i].name, uploaded_files[i].getvalue(), options): i
+                    for i in pending
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    i = futures[future]
+                    df, elapsed = future.result()
+                    if df is not None:
+                        cache.put(pending[i], df)
+                        frames[i] = df
+                    report[labels[i]].update({"耗时(秒)": round(elapsed, 3), "来源": "解析"})
+                    if progress_callback is not None:
+                        progress_callback(done / len(pending), labels[i])
+
+        merged, column_report = DataUtils.align_frames(
+            [(labels[i], df) for i, df in enumerate(frames) if df is not None]
+        )
+        if merged is not None and options.get("compact"):
+            # 各文件的分类列类别不同，合并后会退化为文本，需要重新压缩
+            merged = DataUtils.compact_dtypes(merged)
+        for name, info in column_report.items():
+            report[name].update(info)
+        return merged, report
+
+    @staticmethod
+    def align_frames(named_frames):
+        """按指标名称时间对齐合并多个数据集，并统计各文件与合并结果不一致的列"""
+        if not named_frames:
+            return None, {}
+
+        all_columns = []
+        for _, df in named_frames:
+            all_columns.extend(col for col in df.columns if col not in all_columns)
+
+        column_report = {}
+        for name, df in named_frames:
+            missing = [col for col in all_columns if col not in df.columns]
+            column_report[name] = {
+                "行数": len(df),
+                "列数": df.shape[1],
+                "缺少的列": "、".join(missing)
+            }
+
+        merged = pd.concat([df for _, df in named_frames], ignore_index=True, sort=False)
+        merged = merged[all_columns]
+        if DataUtils.has_period_axis(merged):
+            merged = merged.sort_values('指标名称', kind='stable', ignore_index=True)
+        return merged, column_report
+
+    @staticmethod
+    def _parse_file(uploaded_file, progress_callback=None, compact=False, **options):
+        """解析文件，按需压缩数据类型"""
+        df = DataUtils._read_file(uploaded_file, progress_callback=progress_callback, **options)
+        if df is not None and compact:
+            df = DataUtils.compact_dtypes(df)
+        return df
+
+    @staticmethod
+    def _read_file(uploaded_file, progress_callback=None, streaming=False, sheet_name=0, excel_backend=None):
         """判断格式选取读法"""
         if uploaded_file.name.endswith('.csv'):
+            # 大文件分块流式读取
+            if streaming:
+                return DataUtils._read_csv_chunked(uploaded_file, progress_callback)
+
             df = pd.read_csv(uploaded_file)
             # 创建布尔掩码，标记需要删除的行
             mask = (df.iloc[:, 0] == '计量单位') | (df.iloc[:, 0] == '代码')
 
             # 保留掩码为False的行（即不是"号码"或"类型"的行）
             df = df[~mask]
-            df['指标名称'] = pd.to_numeric(df['指标名称'], errors='coerce')  # 先转换为数值类型
-            df['指标名称'] = pd.to_datetime(df['指标名称'],unit='M', origin='1899-12-30',errors='coerce')
-            df['指标名称'] = df['指标名称'].interpolate(method='linear')
-            df['指标名称'] = df['指标名称'].dt.to_period('M')  # 只保留月份
-            df['指标名称'] = df['指标名称'].astype(str)
-            #df['指标名称'] = df['指标名称'].dt.to_period('Y')  # 只保留月份
+            df['指标名称'] = PeriodParser.parse(df['指标名称'])      # 转为月度Period
             return df
         
         elif uploaded_file.name.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(uploaded_file, parse_dates=[0])
+            df = ExcelReader.read_sheet(uploaded_file, sheet_name=sheet_name, backend=excel_backend)
             # 创建布尔掩码，标记需要删除的行
             mask = (df.iloc[:, 0] == '计量单位') | (df.iloc[:, 0] == '代码')
 
             # 保留掩码为False的行（即不是"号码"或"类型"的行）
             df = df[~mask]
-            df['指标名称'] = pd.to_numeric(df['指标名称'], errors='coerce')  # 先转换为数值类型
-            df['指标名称'] = pd.to_datetime(df['指标名称'],unit='D', origin='1899-12-30',errors='coerce')
-            df['指标名称'] = df['指标名称'].interpolate(method='linear')
-            df['指标名称'] = df['指标名称'].dt.to_period('M')  # 只保留月份
-            df['指标名称'] = df['指标名称'].astype(str)
-            #df['指标名称'] = df['指标名称'].dt.to_period('Y')  # 只保留月份
+            df['指标名称'] = PeriodParser.parse(df['指标名称'])      # 转为月度Period
             return df
         
         else:
@@ -236,19 +1262,826 @@ class DataUtils:
             return None
 
     @staticmethod
-    def get_data_summary(df):
-        """获取数据集的摘要信息"""
+    def _read_csv_chunked(uploaded_file, progress_callback=None, chunk_rows=None):
+        """分块读取CSV，逐块写入预先分配的列数组：不保留分块、不做拼接，峰值内存接近最终结果"""
+        chunk_rows = chunk_rows or CSV_CHUNK_ROWS
+        total_bytes = uploaded_file.size or 1
+
+        # 表头后的元数据行（计量单位、代码）读取时直接跳过，数值列不会被推断为文本
+        uploaded_file.seek(0)
+        head = pd.read_csv(uploaded_file, nrows=CSV_METADATA_SCAN_ROWS, dtype=str)
+        metadata_lines = [i + 1 for i in np.flatnonzero(head.iloc[:, 0].isin(['计量单位', '代码']).to_numpy())]
+
+        # 按换行符数估计行数上限，只扫描一遍字节，不解析
+        uploaded_file.seek(0)
+        capacity = sum(block.count(b"\n") for block in iter(lambda: uploaded_file.read(1 << 24), b"")) + 1
+        uploaded_file.seek(0)
+
+        first_col = head.columns[0] if len(head.columns) else None
+        numeric = None      # 数值列 -> 预先分配的float64数组
+        integer = {}        # 数值列 -> 是否各块都是整数（最后转回int64）
+        dates = None        # 指标名称 -> 预先分配的datetime64数组
+        others = {}     # 其他列 -> 分块列表（文本列通常很少）
+        rows_read = 0
+
+        reader = pd.read_csv(uploaded_file, chunksize=chunk_rows, skiprows=metadata_lines, low_memory=False)
+        for chunk in reader:
+            # 表头附近以外的元数据行（少见），删除后把文本列转回数值
+            mask = (chunk.iloc[:, 0] == '计量单位') | (chunk.iloc[:, 0] == '代码')
+            if mask.any():
+                chunk = chunk[~mask]
+                for col in chunk.columns[1:]:
+                    if not pd.api.types.is_numeric_dtype(chunk[col]):
+                        converted = pd.to_numeric(chunk[col], errors='coerce')
+                        if converted.isna().sum() == chunk[col].isna().sum():
+                            chunk[col] = converted
+
+            if numeric is None:
+                # 第一块决定各列的存放方式
+                numeric = {
+                    col: np.empty(capacity, dtype=np.float64) for col in chunk.columns
+                    if col != first_col and pd.api.types.is_numeric_dtype(chunk[col])
+                }
+                integer = {col: True for col in numeric}
+                others = {col: [] for col in chunk.columns if col != first_col and col not in numeric}
+
+            end = rows_read + len(chunk)
+            for col in chunk.columns:
+                series = chunk[col]
+                if col == first_col:
+                    # 插值需要整列数据，这里只做逐块的日期转换
+                    converted = PeriodParser.to_datetime(series).to_numpy()
+                    if dates is None:
+                        dates = np.empty(capacity, dtype=converted.dtype)
+                    dates[rows_read:end] = converted
+                elif col in numeric:
+                    if pd.api.types.is_numeric_dtype(series):
+                        numeric[col][rows_read:end] = series.to_numpy(dtype=np.float64, na_value=np.nan)
+                        integer[col] = integer[col] and pd.api.types.is_integer_dtype(series)
+                    else:
+                        # 后面的块出现了文本，该列改为按块保存
+                        filled = pd.Series(numeric.pop(col)[:rows_read], name=col)
+                        others[col] = [filled.astype(np.int64) if integer.pop(col) else filled, series.reset_index(drop=True)]
+                else:
+                    others[col].append(series.reset_index(drop=True))
+            rows_read = end
+
+            if progress_callback is not None:
+                progress_callback(min(uploaded_file.tell() / total_bytes, 1.0), rows_read)
+
+        if numeric is None:
+            return pd.DataFrame()
+
+        # 按原列顺序组装，数值列直接引用预分配数组的前rows_read行（不复制）
+        data = {}
+        for col in chunk.columns:
+            if col == first_col:
+                data[col] = PeriodParser.from_datetime(dates[:rows_read])
+            elif col in numeric:
+                values = numeric[col][:rows_read]
+                data[col] = values.astype(np.int64) if integer[col] else values
+            else:
+                data[col] = pd.concat(others[col], ignore_index=True) if len(others[col]) > 1 else others[col][0]
+        return pd.DataFrame(data, copy=False)
+
+    @staticmethod
+    def compact_dtypes(df, category_ratio=COMPACT_CATEGORY_RATIO):
+        """无损压缩数据类型：文本数值转回数值，float64/int64降为float32/int32，低基数文本转为分类"""
+        before = int(df.memory_usage(deep=True).sum())
+        compacted = {}
+
+        for col in df.columns:
+            series = df[col]
+            if col == '指标名称' or isinstance(series.dtype, (pd.PeriodDtype, pd.CategoricalDtype)):
+                continue
+
+            # 读取时混入了元数据行的数值列会被推断为文本
+            if not pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_datetime64_any_dtype(series):
+                converted = pd.to_numeric(series, errors='coerce')
+                if converted.notna().sum() == series.notna().sum():
+                    series = converted
+
+            if pd.api.types.is_float_dtype(series):
+                series = DataUtils._downcast_float(series)
+            elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+                if series.empty or (series.min() >= np.iinfo(np.int32).min and series.max() <= np.iinfo(np.int32).max):
+                    series = series.astype(np.int32)
+            elif not pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_datetime64_any_dtype(series):
+                if len(series) and series.nunique() <= category_ratio * len(series):
+                    series = series.astype('category')
+
+            if series is not df[col]:
+                compacted[col] = series
+
+        if compacted:
+            df = df.assign(**compacted)
+        df.attrs["compaction"] = {"before": before, "after": int(df.memory_usage(deep=True).sum())}
+        return df
+
+    @staticmethod
+    def _downcast_float(series):
+        """在数据自身的小数精度内可还原时降为float32（整数值且无缺失时降为int32）"""
+        values = series.to_numpy(dtype=np.float64)
+        finite = values[np.isfinite(values)]
+        if finite.size == 0:
+            return series.astype(np.float32)
+
+        if finite.size == values.size and np.array_equal(finite, np.round(finite)) \
+                and finite.min() >= np.iinfo(np.int32).min and finite.max() <= np.iinfo(np.int32).max:
+            return series.astype(np.int32)
+
+        # 找到数据实际使用的小数位数（最多6位），float32在该精度内能还原时才降级
+        for decimals in range(7):
+            if np.array_equal(np.round(finite, decimals), finite):
+                as_float32 = finite.astype(np.float32).astype(np.float64)
+                if np.array_equal(np.round(as_float32, decimals), finite):
+                    return series.astype(np.float32)
+                break
+        return series
+
+    @staticmethod
+    def has_period_axis(df):
+        """指标名称列是否为月度Period类型"""
+        return '指标名称' in df.columns and isinstance(df['指标名称'].dtype, pd.PeriodDtype)
+
+    @staticmethod
+    def sort_by_period(df):
+        """保证按指标名称有序（月报通常已按时间排列，此时不复制）"""
+        if df['指标名称'].hasnans:
+            df = df[df['指标名称'].notna()]
+        if not df['指标名称'].is_monotonic_increasing:
+            df = df.sort_values('指标名称', kind='stable')
+        return df
+
+    @staticmethod
+    def slice_periods(df, start, end):
+        """在有序的指标名称上二分查找时间范围，返回行切片"""
+        periods = pd.PeriodIndex(df['指标名称'])
+        lo = periods.searchsorted(start, side='left')
+        hi = periods.searchsorted(end, side='right')
+        return df.iloc[lo:hi]
+
+    @staticmethod
+    def to_chart_frame(df):
+        """绘图用视图：Plotly/Vega无法序列化Period，指标名称转为月初时间戳"""
+        if DataUtils.has_period_axis(df):
+            return df.assign(**{'指标名称': df['指标名称'].dt.to_timestamp()})
+        return df
+
+    @staticmethod
+    def format_period(value):
+        """下拉框中按年月显示时间"""
+        if isinstance(value, (pd.Timestamp, pd.Period)):
+            return value.strftime('%Y-%m')
+        return str(value)
+
+    @staticmethod
+    def get_data_summary(df, profile=None):
+        """获取数据集的摘要信息（有数据概况时直接读取缺失值统计）"""
         if df is None:
             return {}
         
         summary = {
             "shape": df.shape,
             "columns": list(df.columns),
-            "missing_values": df.isnull().sum().to_dict(),
+            "missing_values": (profile.null_counts if profile is not None else df.isnull().sum()).to_dict(),
             "dtypes": df.dtypes.astype(str).to_dict()
         }
         return summary
 
+# =======清洗流水线==========================
+VERSION_MEMO_MAX_ENTRIES = 64       # 每个会话缓存的清洗结果版本数
+UNDO_MAX_BYTES = 256 * 1024 * 1024      # 每个会话撤销数据（被删除的行、被覆盖的值）的内存上限
+
+# 清洗步骤：操作名 + 参数
+class CleaningStep:
+    def __init__(self, op, params=None):
+        self.op = op
+        self.params = params or {}
+
+    @property
+    def key(self):
+        """步骤的规范化表示，相同输入版本和相同key的步骤结果相同"""
+        return json.dumps(self.to_dict(), sort_keys=True, ensure_ascii=False, default=str)
+
+    @property
+    def label(self):
+        return CleaningOps.LABELS.get(self.op, self.op)
+
+    def to_dict(self):
+        return {"op": self.op, "params": self.params}
+
+    @staticmethod
+    def from_dict(data):
+        return CleaningStep(data["op"], data.get("params"))
+
+# 清洗操作：根据输入数据计算本步骤的变化，不修改输入、不依赖界面，返回(变化, 统计信息)
+class CleaningOps:
+    LABELS = {
+        "drop_na": "删除包含空值的行",
+        "drop_duplicates": "删除重复值",
+        "drop_rows": "删除指定行",
+        "drop_periods": "按时间范围删除",
+        "drop_where": "按条件删除",
+        "format": "数据格式化",
+        "impute": "缺失值填充"
+    }
+
+    ROW_FILTERS = ("drop_na", "drop_periods")     # 逐行判断是否删除的操作（结果只取决于该行本身）
+
+    # 条件表达式允许的语法：列名、常量、比较、与或非、算术运算，以及列的isna()/notna()
+    EXPR_NODES = (
+        ast.Expression, ast.Name, ast.Load, ast.Constant, ast.List, ast.Tuple,
+        ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn,
+        ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.Invert, ast.UAdd, ast.USub,
+        ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.BitAnd, ast.BitOr
+    )
+    EXPR_METHODS = ("isna", "notna")
+
+    @staticmethod
+    def run(step, df):
+        """执行一个步骤"""
+        if step.op not in CleaningOps.LABELS:
+            raise ValueError(f"未知的清洗操作: {step.op}")
+        return getattr(CleaningOps, step.op)(df, step.params)
+
+    @staticmethod
+    def drop_na(df, params):
+        """删除包含空值的行"""
+        keep = df.notna().all(axis=1).to_numpy()
+        return {"row_mask": keep}, {"removed": int((~keep).sum())}
+
+    @staticmethod
+    def drop_duplicates(df, params):
+        """删除重复行"""
+        keep = ~df.duplicated().to_numpy()
+        return {"row_mask": keep}, {"removed": int((~keep).sum())}
+
+    @staticmethod
+    def drop_rows(df, params):
+        """按行号删除（params["rows"]形如"1,3,5-8"）"""
+        intervals = CleaningOps.parse_row_intervals(params.get("rows", ""), len(df))
+        keep = CleaningOps.intervals_to_mask(intervals, len(df))
+        return {"row_mask": keep}, {"removed": sum(end - start for start, end in intervals)}
+
+    @staticmethod
+    def parse_row_intervals(input_str, max_row):
+        """解析用户输入的行号，返回有序、不重叠的左闭右开区间列表"""
+        intervals = []
+        
+        # 按逗号分割不同的行号范围
+        parts = input_str.split(',')
+        for part in parts:
+            part = part.strip()
+            if '-' in part:
+                # 处理范围 (如 1-5)
+                range_parts = part.split('-')
+                if len(range_parts) == 2:
+                    try:
+                        start = int(range_parts[0].strip())
+                        end = int(range_parts[1].strip())
+                        if 0 <= start <= end < max_row:
+                            intervals.append((start, end + 1))
+                    except ValueError:
+                        continue
+            else:
+                # 处理单个行号
+                try:
+                    row_num = int(part.strip())
+                    if 0 <= row_num < max_row:
+                        intervals.append((row_num, row_num + 1))
+                except ValueError:
+                    continue
+        
+        return CleaningOps.merge_intervals(intervals)
+
+    @staticmethod
+    def merge_intervals(intervals):
+        """合并重叠或相邻的区间"""
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def intervals_to_mask(intervals, length):
+        """区间内的行为False，其余为True（每个区间一次切片赋值）"""
+        keep = np.ones(length, dtype=bool)
+        for start, end in intervals:
+            keep[start:end] = False
+        return keep
+
+    @staticmethod
+    def parse_period_ranges(input_str):
+        """解析时间范围（如"2015, 2018-03~2018-06"），返回月序号（年×12+月）的闭区间列表"""
+        ranges = []
+        for part in input_str.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            start_str, sep, end_str = part.partition('~')
+            # 年份表示整年，月份表示单月
+            start = pd.Period(start_str.strip()).asfreq('M', how='start')
+            end = pd.Period((end_str if sep else start_str).strip()).asfreq('M', how='end')
+            if start > end:
+                raise ValueError(f"时间范围的起点晚于终点: {part}")
+            ranges.append((start.year * 12 + start.month, end.year * 12 + end.month))
+        return ranges
+
+    @staticmethod
+    def drop_periods(df, params):
+        """按指标名称的时间范围删除（params["periods"]形如"2015, 2018-03~2018-06"）"""
+        months = CleaningOps.month_axis(df)
+        if months is None:
+            raise ValueError("第一列不是时间类型，无法按时间范围删除")
+        drop = np.zeros(len(df), dtype=bool)
+        for start, end in CleaningOps.parse_period_ranges(params.get("periods", "")):
+            drop |= (months >= start) & (months <= end)
+        return {"row_mask": ~drop}, {"removed": int(drop.sum())}
+
+    @staticmethod
+    def drop_where(df, params):
+        """删除满足条件表达式的行（params["expr"]如"`工业增加值` < 0"，语法同DataFrame.eval）"""
+        expr = params.get("expr", "")
+        CleaningOps.check_expr(expr, df.columns)
+        # 表达式只能引用列，不传入任何变量
+        result = df.eval(expr, local_dict={}, global_dict={})
+        if not isinstance(result, pd.Series) or not pd.api.types.is_bool_dtype(result):
+            raise ValueError("条件表达式的结果必须是每行一个真/假值")
+        drop = result.fillna(False).to_numpy(dtype=bool)
+        return {"row_mask": ~drop}, {"removed": int(drop.sum())}
+
+    @staticmethod
+    def check_expr(expr, columns):
+        """检查条件表达式只使用允许的语法（不能用@引用变量，也不能访问列以外的属性）"""
+        columns = {str(col) for col in columns}
+        # `包围的列名替换为占位名后按Python表达式解析
+        parts = expr.split("`")
+        if len(parts) % 2 == 0:
+            raise ValueError("条件表达式中的`没有成对出现")
+        placeholders = set()
+        for i in range(1, len(parts), 2):
+            if parts[i] not in columns:
+                raise ValueError(f"数据中没有列“{parts[i]}”")
+            parts[i] = f"__column_{i}__"
+            placeholders.add(parts[i])
+        code = "".join(parts)
+        if "@" in code:
+            raise ValueError("条件表达式不能使用@引用变量")
+        try:
+            tree = ast.parse(code.strip(), mode="eval")
+        except SyntaxError:
+            raise ValueError(f"条件表达式语法错误: {expr}")
+
+        method_calls = set()        # 允许的isna()/notna()调用中的属性节点
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Call):
+                func = node.func
+                if not (isinstance(func, ast.Attribute) and func.attr in CleaningOps.EXPR_METHODS
+                        and isinstance(func.value, ast.Name) and not node.args and not node.keywords):
+                    raise ValueError("条件表达式中只能调用列的isna()或notna()")
+                method_calls.add(id(func))
+            elif isinstance(node, ast.Attribute):
+                if id(node) not in method_calls:
+                    raise ValueError("条件表达式中只能调用列的isna()或notna()")
+            elif isinstance(node, ast.Name):
+                if node.id not in columns and node.id not in placeholders:
+                    raise ValueError(f"数据中没有列“{node.id}”")
+            elif not isinstance(node, CleaningOps.EXPR_NODES):
+                raise ValueError(f"条件表达式中不支持: {type(node).__name__}")
+
+    @staticmethod
+    def format(df, params):
+        """第一列转时间，其余列转数值型（params["excel_dates"]表示第一列是Excel日期序列号）"""
+        first_col = df.columns[0]
+        column_updates = {}
+
+        # 转换第一列为时间类型
+        if isinstance(df[first_col].dtype, pd.PeriodDtype):
+            # 导入时已解析为月度Period
+            column_updates[first_col] = df[first_col].dt.to_timestamp()
+        elif params.get("excel_dates"):
+            # Excel日期是从1900-01-01开始的天数，使用origin='1899-12-30'来校正Excel的日期偏移错误
+            column_updates[first_col] = pd.to_datetime(
+                df[first_col].astype(float), unit='D', origin='1899-12-30', errors='coerce'
+            )
+        elif not pd.api.types.is_datetime64_any_dtype(df[first_col]):
+            # 常规时间转换
+            column_updates[first_col] = pd.to_datetime(df[first_col], errors='coerce')
+
+        failed = {}
+        if first_col in column_updates:
+            failed[first_col] = int(column_updates[first_col].isna().sum() - df[first_col].isna().sum())
+
+        # 其余非数值列作为一个整体转换为数值型（已是数值的列不变）
+        text_cols = [col for col in df.columns[1:] if not pd.api.types.is_numeric_dtype(df[col])]
+        scaled = 0
+        if text_cols:
+            values, col_failed, scaled = CleaningOps.to_numeric_block(df[text_cols])
+            for i, col in enumerate(text_cols):
+                column_updates[col] = pd.Series(values[i], index=df.index, name=col)
+                failed[col] = int(col_failed[i])
+        return {"column_updates": column_updates}, {"failed": failed, "scaled": scaled}
+
+    # 数值的单位后缀
+    UNIT_SUFFIXES = {"万": 1e4, "亿": 1e8}
+
+    @staticmethod
+    def to_numeric_block(block):
+        """把若干列一次性转为数值：去掉千分位分隔符，按万/亿后缀换算，
+        转换的同时统计每列失败（非空却无法解析）的单元格数。
+        返回(形状为(列数, 行数)的float64数组, 各列失败数, 按单位换算的单元格数)"""
+        rows, cols = block.shape
+        # 按列展开成一列，逐列连续存放，先直接解析（大多数单元格已是规范数字）
+        flat = pd.Series(block.to_numpy(dtype=object).ravel(order='F'), dtype=object)
+        numbers = pd.to_numeric(flat, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        failed = np.isnan(numbers) & flat.notna().to_numpy()
+
+        # 只对解析失败的单元格去掉千分位分隔符和单位后缀后重试
+        scaled = 0
+        retry = np.flatnonzero(failed)
+        if len(retry):
+            text = flat.iloc[retry].astype("string").str.replace(r"[,，\s]", "", regex=True)
+            multiplier = np.ones(len(text))
+            for suffix, factor in CleaningOps.UNIT_SUFFIXES.items():
+                multiplier[text.str.endswith(suffix).fillna(False).to_numpy(dtype=bool)] = factor
+            has_unit = multiplier != 1
+            text = text.where(~has_unit, text.str[:-1])
+            retried = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan) * multiplier
+            numbers[retry] = retried
+            # 空白单元格视为缺失值而不是转换失败
+            failed[retry] = np.isnan(retried) & (text != "").fillna(False).to_numpy(dtype=bool)
+            scaled = int((has_unit & ~np.isnan(retried)).sum())
+
+        return numbers.reshape(cols, rows), failed.reshape(cols, rows).sum(axis=1), scaled
+
+    # 缺失值填充方法
+    IMPUTE_STRATEGIES = {
+        "linear": "线性插值（按时间）",
+        "spline": "样条插值（按时间）",
+        "ffill": "向前填充",
+        "bfill": "向后填充",
+        "seasonal": "去年同月",
+        "mean": "均值",
+        "median": "中位数",
+        "mode": "众数"
+    }
+    NUMERIC_STRATEGIES = ("linear", "spline", "mean", "median")     # 只适用于数值列的方法
+
+    @staticmethod
+    def impute_strategies(numeric=True):
+        """列可用的填充方法（样条插值需要安装scipy）"""
+        return [
+            strategy for strategy in CleaningOps.IMPUTE_STRATEGIES
+            if (numeric or strategy not in CleaningOps.NUMERIC_STRATEGIES)
+            and (strategy != "spline" or scipy_interpolate is not None)
+        ]
+
+    @staticmethod
+    def month_axis(df):
+        """第一列换算为月序号（年×12+月），用于按时间插值和同月对齐；第一列不是时间时返回None"""
+        first = df[df.columns[0]]
+        if not (isinstance(first.dtype, pd.PeriodDtype) or pd.api.types.is_datetime64_any_dtype(first)):
+            return None
+        return (first.dt.year * 12 + first.dt.month).to_numpy(dtype=float)
+
+    @staticmethod
+    def impute(df, params):
+        """缺失值填充：按列选择填充方法，同一方法的列作为一个整体计算
+        （params: numeric/text为数值列/其他列的默认方法，strategies为按列指定的方法）"""
+        months = CleaningOps.month_axis(df)
+        missing = df.isna()
+        missing_counts = missing.sum()
+
+        # 按填充方法对有缺失值的列分组（时间列本身不填充）
+        groups = {}
+        for col in missing_counts.index[missing_counts.to_numpy() > 0]:
+            if months is not None and col == df.columns[0]:
+                continue
+            numeric = pd.api.types.is_numeric_dtype(df[col])
+            strategy = params.get("strategies", {}).get(col)
+            if strategy not in CleaningOps.impute_strategies(numeric):
+                strategy = params.get("numeric", "mean") if numeric else params.get("text", "mode")
+            groups.setdefault(strategy, []).append(col)
+
+        cell_updates = {}
+        by_strategy = {}
+        by_column = {}
+        for strategy, cols in groups.items():
+            block = df[cols]
+            filled = CleaningOps._fill_block(block, strategy, months)
+            # 只记录原本缺失、填充后有值的单元格
+            newly_filled = (missing[cols] & filled.notna()).to_numpy()
+            for i, col in enumerate(cols):
+                positions = np.flatnonzero(newly_filled[:, i])
+                if not len(positions):
+                    continue
+                values = filled[col].to_numpy()[positions]
+                # 填充值按列的类型保存，避免写入时类型不兼容
+                if isinstance(df[col].dtype, np.dtype):
+                    values = values.astype(df[col].dtype)
+                cell_updates[col] = (positions, values)
+                by_column[col] = len(positions)
+            by_strategy[strategy] = sum(by_column.get(col, 0) for col in cols)
+
+        stats = {
+            "filled": sum(by_column.values()),
+            "by_strategy": by_strategy,
+            "by_column": by_column,
+            "remaining": int(missing_counts.sum()) - sum(by_column.values())
+        }
+        return {"cell_updates": cell_updates}, stats
+
+    @staticmethod
+    def _fill_block(block, strategy, months):
+        """用一种方法填充一组列，返回填充后的数据（不修改输入）"""
+        if strategy == "mean":
+            return block.fillna(block.mean())
+        if strategy == "median":
+            return block.fillna(block.median())
+        if strategy == "mode":
+            modes = block.mode(dropna=True)
+            return block.fillna(modes.iloc[0]) if not modes.empty else block
+
+        # 以下方法依赖时间顺序：按月序号排序后计算，再按原行号对齐回去
+        if months is None:
+            order = np.arange(len(block))
+            x = order.astype(float)
+        else:
+            order = np.argsort(months, kind='stable')
+            order = order[~np.isnan(months[order])]
+            x = months[order]
+        ordered = block.iloc[order].set_axis(pd.Index(x))
+
+        if strategy == "ffill":
+            result = ordered.ffill()
+        elif strategy == "bfill":
+            result = ordered.bfill()
+        elif strategy in ("linear", "spline"):
+            # 按月序号的间距插值，只填充两端有值的中间部分
+            try:
+                if strategy == "spline":
+                    result = ordered.interpolate(method="spline", order=3, limit_area="inside")
+                else:
+                    result = ordered.interpolate(method="index", limit_area="inside")
+            except ValueError:
+                # 有效点太少无法拟合样条时退回线性插值
+                result = ordered.interpolate(method="index", limit_area="inside")
+        elif strategy == "seasonal":
+            # 用往年同月最近一个有值的数据填充：按月份分组后向前填充
+            result = ordered.groupby((x - 1) % 12, sort=False).ffill()
+        else:
+            raise ValueError(f"未知的填充方法: {strategy}")
+
+        return block.fillna(result.set_axis(block.index[order]))
+
+# 清洗流水线：依次执行步骤，每步结果按(输入版本, 步骤参数)缓存
+class CleaningPipeline:
+    def __init__(self, steps=None):
+        self.steps = list(steps or [])
+
+    @staticmethod
+    def derive_id(parent_id, step):
+        """输出版本的ID由输入版本和步骤参数唯一确定"""
+        return hashlib.sha256(f"{parent_id}|{step.key}".encode('utf-8')).hexdigest()[:32]
+
+    @staticmethod
+    def prepare(version, step, memo=None):
+        """计算version上执行一步的结果版本（只记录变化，不生成数据），可用于预览"""
+        version_id = CleaningPipeline.derive_id(version.version_id, step)
+        child = memo.get(version_id) if memo is not None else None
+        if child is None:
+            delta, stats = CleaningOps.run(step, version.materialize())
+            child = DatasetVersion(
+                parent=version, label=step.label, version_id=version_id, step=step, stats=stats, **delta
+            )
+            child.record_undo(version.materialize())
+            if version._profile is not None:
+                child.profile
+            if memo is not None:
+                memo[version_id] = child
+                while len(memo) > VERSION_MEMO_MAX_ENTRIES:
+                    memo.popitem(last=False)
+        elif memo is not None:
+            memo.move_to_end(version_id)
+        return child
+
+    @staticmethod
+    def apply_step(version, step, memo=None):
+        """在version上执行一步，命中缓存时只做查找，返回输出版本"""
+        # 结果数据在需要时才生成（重新运行时已缓存的步骤不重放）
+        return CleaningPipeline.prepare(version, step, memo)
+
+    def to_dict(self):
+        """清洗配方：步骤列表，可保存为JSON"""
+        return {"steps": [step.to_dict() for step in self.steps]}
+
+    @staticmethod
+    def from_dict(data):
+        steps = [CleaningStep.from_dict(step) for step in data.get("steps", [])]
+        for step in steps:
+            if step.op not in CleaningOps.LABELS:
+                raise ValueError(f"未知的清洗操作: {step.op}")
+        return CleaningPipeline(steps)
+
+    @staticmethod
+    def from_version(version):
+        """由版本的历史得到产生它的流水线"""
+        return CleaningPipeline(node.step for node in version.history()[1:])
+
+    def replay(self, df):
+        """一次执行全部步骤（加载配方、批量处理时使用）：不生成中间版本、不记录撤销数据，
+        连续的删除行步骤合并为一个保留行位置数组，需要整表数据时才按位置取一次行。
+        返回(结果数据, 各步骤的统计信息)"""
+        kept = None     # 待应用的保留行（df中的行位置），None表示全部保留
+        all_stats = []
+        for step in self.steps:
+            if step.op in CleaningOps.ROW_FILTERS:
+                # 逐行判断的条件与其他行无关，直接在未取行的数据上计算
+                delta, _ = CleaningOps.run(step, df)
+                keep = delta["row_mask"] if kept is None else delta["row_mask"][kept]
+                stats = {"removed": int((~keep).sum())}
+            elif step.op == "drop_rows":
+                # 行号相对于上一步的结果，换算为df中的位置
+                length = len(df) if kept is None else len(kept)
+                intervals = CleaningOps.parse_row_intervals(step.params.get("rows", ""), length)
+                keep = CleaningOps.intervals_to_mask(intervals, length)
+                stats = {"removed": sum(end - start for start, end in intervals)}
+            else:
+                if kept is not None:
+                    if len(kept) < len(df):
+                        df = df.take(kept).reset_index(drop=True)
+                    kept = None
+                delta, stats = CleaningOps.run(step, df)
+                keep = delta.pop("row_mask", None)
+                if delta:
+                    df = DatasetVersion(row_mask=keep, **delta).apply_to(df)
+                    keep = None
+            if keep is not None:
+                kept = np.flatnonzero(keep) if kept is None else kept[keep]
+            all_stats.append(stats)
+
+        if kept is not None and len(kept) < len(df):
+            df = df.take(kept).reset_index(drop=True)
+        return df, all_stats
+
+    def run(self, base, memo=None):
+        """从基础版本开始执行全部步骤"""
+        version = base
+        for step in self.steps:
+            version = CleaningPipeline.apply_step(version, step, memo)
+        return version
+
+# =======数据导出==========================
+EXPORT_CACHE_MAX_BYTES = 512 * 1024 * 1024      # 导出文件缓存上限（按文件字节数计）
+EXPORT_CHUNK_ROWS = 10000       # 导出时每次写入的行数（决定导出时的内存峰值）
+EXPORT_SPOOL_MAX_BYTES = 32 * 1024 * 1024       # 导出文件超过该大小时转存到磁盘临时文件
+
+# 导出生成的文件：写入临时文件（小文件在内存中，大文件在磁盘上），可被多个下载同时读取
+class ExportFile:
+    def __init__(self):
+        self.file = tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES)
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def finish(self):
+        """写入完成后记录文件大小"""
+        self.size = self.file.tell()
+        return self
+
+    def read(self):
+        """读取文件内容（下载时由Streamlit发送给浏览器）"""
+        with self._lock:
+            self.file.seek(0)
+            return self.file.read()
+
+# 导出文件缓存：按(数据版本, 格式, 导出选项)缓存生成的文件，相同的下载不重复生成
+class ExportCache(LRUCache):
+    def __init__(self, max_bytes=EXPORT_CACHE_MAX_BYTES):
+        super().__init__(max_bytes, sizeof=len)
+
+    @staticmethod
+    def make_key(version_id, export_format, options):
+        return (version_id, export_format, tuple(sorted(options.items())))
+
+# 整个服务进程只创建一个导出缓存（版本ID由数据内容和清洗步骤决定，各会话可共用）
+@st.cache_resource
+def get_export_cache():
+    return ExportCache()
+
+# 导出清洗后数据：分块写入临时文件，内存占用与数据行数无关
+class DataExporter:
+    # 格式 -> (扩展名, MIME类型)
+    FORMATS = {
+        "CSV": (".csv", "text/csv"),
+        "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+        "Parquet": (".parquet", "application/vnd.apache.parquet"),
+        "Feather": (".feather", "application/vnd.apache.arrow.file"),
+        "Arrow IPC": (".arrow", "application/vnd.apache.arrow.file")
+    }
+    COLUMNAR_FORMATS = ("Parquet", "Feather", "Arrow IPC")      # 需要pyarrow，保留Period、分类和float32类型
+    PARQUET_COMPRESSIONS = ["snappy", "zstd", "gzip", "none"]
+
+    @staticmethod
+    def available_formats():
+        """返回当前环境可用的导出格式"""
+        return [f for f in DataExporter.FORMATS if f not in DataExporter.COLUMNAR_FORMATS or pa is not None]
+
+    @staticmethod
+    def file_info(export_format, options=None):
+        """导出文件的扩展名和MIME类型"""
+        extension, mime = DataExporter.FORMATS[export_format]
+        if export_format == "CSV" and (options or {}).get("gzip"):
+            return extension + ".gz", "application/gzip"
+        return extension, mime
+
+    @staticmethod
+    def write(df, export_format, fileobj, options=None):
+        """把数据按指定格式分块写入二进制文件对象"""
+        options = options or {}
+        if export_format == "CSV":
+            DataExporter._write_csv(df, fileobj, gzip_output=options.get("gzip", False))
+        elif export_format == "Excel":
+            DataExporter._write_excel(df, fileobj)
+        elif export_format in DataExporter.COLUMNAR_FORMATS:
+            DataExporter._write_columnar(df, export_format, fileobj, options.get("compression", "snappy"))
+        else:
+            raise ValueError(f"不支持的导出格式: {export_format}")
+
+    @staticmethod
+    def _write_csv(df, fileobj, gzip_output=False):
+        """每块编码后直接写入文件（可选gzip压缩），不生成完整的字符串"""
+        target = gzip.GzipFile(fileobj=fileobj, mode='wb') if gzip_output else fileobj
+        text = TextIOWrapper(target, encoding='utf-8', newline='')
+        df.to_csv(text, index=False, chunksize=EXPORT_CHUNK_ROWS)
+        text.flush()
+        text.detach()       # 不关闭下层文件
+        if gzip_output:
+            target.close()      # 写入gzip结尾，fileobj保持打开
+
+    @staticmethod
+    def _write_excel(df, fileobj):
+        """openpyxl只写模式逐行写入（行数据暂存在磁盘上），不构建完整的工作簿对象树"""
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Sheet1")
+        sheet.append([str(col) for col in df.columns])
+        for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+            chunk = df.iloc[start:start + EXPORT_CHUNK_ROWS]
+            # openpyxl不能写入Period，指标名称按年月文本导出
+            if DataUtils.has_period_axis(chunk):
+                chunk = chunk.assign(**{'指标名称': chunk['指标名称'].astype(str)})
+            values = chunk.to_numpy(dtype=object)
+            values[pd.isna(values)] = None      # 空值写为空单元格
+            for row in values.tolist():
+                sheet.append(row)
+        workbook.save(fileobj)
+
+    @staticmethod
+    def _write_columnar(df, export_format, fileobj, compression="snappy"):
+        """列式格式：数值列零拷贝转为Arrow，按批写入；读取时无需重新解析日期和数值"""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        batches = table.to_batches(max_chunksize=EXPORT_CHUNK_ROWS * 10)
+        if export_format == "Parquet":
+            import pyarrow.parquet as pa_parquet
+
+            compression = None if compression == "none" else compression
+            with pa_parquet.ParquetWriter(fileobj, table.schema, compression=compression) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+        elif export_format == "Feather":
+            # Feather即带压缩的Arrow IPC文件
+            options = pa_ipc.IpcWriteOptions(compression="lz4")
+            with pa_ipc.new_file(fileobj, table.schema, options=options) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+        else:
+            # 不压缩的Arrow IPC文件，下游可直接内存映射读取
+            with pa_ipc.new_file(fileobj, table.schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+
+    @staticmethod
+    def export(version, export_format, options=None, cache=None):
+        """生成版本的导出文件（ExportFile），命中缓存时直接返回"""
+        options = options or {}
+        key = ExportCache.make_key(version.version_id, export_format, options)
+        exported = cache.get(key) if cache is not None else None
+        if exported is None:
+            exported = ExportFile()
+            DataExporter.write(version.materialize(), export_format, exported.file, options)
+            exported.finish()
+            if cache is not None:
+                cache.put(key, exported)
+        return exported
+
 # 数据导入模块
 class DataImportModule:
     def __init__(self, state):
@@ -257,6 +2090,12 @@ class DataImportModule:
     def render(self):
         st.header("📤 数据导入")
         
+        # 批量导入模式：一次上传多个月度/区县文件
+        batch_mode = st.toggle("批量导入多个文件", key="batch_import")
+        if batch_mode:
+            self._render_batch_import()
+            return
+
         # 文件上传区域
         uploaded_file = st.file_uploader(
            "上传数据文件(CSV/Excel)",
@@ -267,11 +2106,67 @@ class DataImportModule:
         
         # 上传文件处理
         if uploaded_file:
+            is_csv = uploaded_file.name.endswith('.csv')
+            streaming = is_csv and st.checkbox(
+                "分块流式导入（适用于大文件，内存占用更低）",
+                value=uploaded_file.size > STREAMING_THRESHOLD_BYTES,
+                key="streaming_import"
+            )
+
+            # Excel先只读取工作表目录，由用户选择要解析的工作表
+            excel_options = {}
+            if uploaded_file.name.endswith(('.xlsx', '.xls')):
+                sheet_names = ExcelReader.sheet_names(uploaded_file)
+                sheet_name = st.selectbox(
+                    "选择工作表",
+                    options=sheet_names,
+                    index=0,
+                    key="excel_sheet_select"
+                ) if len(sheet_names) > 1 else sheet_names[0]
+                excel_options = {"sheet_name": sheet_name, "excel_backend": ExcelReader.default_backend()}
+
+            compact = st.checkbox(
+                "导入后压缩数据类型（数值降为float32/int32，低基数文本转为分类，降低内存占用）",
+                value=True,
+                key="compact_import"
+            )
+
+            options = dict(excel_options)
+            if streaming:
+                options["streaming"] = True
+            if compact:
+                options["compact"] = True
+
+            # 缓存键（文件指纹+解析参数）每次运行只计算一次
+            cache_key = DataUtils.parse_key(uploaded_file, options)
             with st.spinner("正在加载数据..."):
-                df = DataUtils.load_data(uploaded_file)
-                self.state.raw_df = df
+                progress_bar = st.progress(0.0, text="正在读取...") if streaming else None
+
+                def update_progress(fraction, rows_read):
+                    progress_bar.progress(fraction, text=f"已读取 {rows_read} 行 ({fraction:.0%})")
+
+                # 优先使用共享的列式存储，未安装pyarrow时保存在内存中
+                handle = DataUtils.load_dataset(
+                    uploaded_file,
+                    progress_callback=update_progress if streaming else None,
+                    cache_key=cache_key,
+                    **options
+                )
+                if handle is not None:
+                    self.state.set_raw_handle(handle)
+                else:
+                    self.state.raw_df = DataUtils.load_data(
+                        uploaded_file,
+                        progress_callback=update_progress if streaming else None,
+                        cache_key=cache_key,
+                        **options
+                    )
+                if progress_bar is not None:
+                    progress_bar.empty()
+                if self.state.has_raw_data:
+                    self.state.attach_dataset(DatasetStore.dataset_id(cache_key), options)
             
-            if self.state.raw_df is not None:
+            if self.state.has_raw_data:
                 self.state.file_uploaded = True
                 st.success(f"数据导入成功! 文件名: {uploaded_file.name}")
                 # 显示数据摘要
@@ -280,9 +2175,74 @@ class DataImportModule:
                 # 显示数据预览
                 self._display_data_preview(self.state.raw_df)
     
+    def _render_batch_import(self):
+        """批量上传：并行解析并按时间合并"""
+        uploaded_files = st.file_uploader(
+            "上传多个数据文件(CSV/Excel)",
+            type=["csv", "xlsx", "xls"],
+            accept_multiple_files=True,
+            key="file_uploader_batch"
+        )
+        if not uploaded_files:
+            return
+
+        compact = st.checkbox(
+            "导入后压缩数据类型（数值降为float32/int32，低基数文本转为分类，降低内存占用）",
+            value=True,
+            key="compact_import_batch"
+        )
+        options = {"compact": True} if compact else {}
+
+        # 同一批文件合并后的结果也写入共享存储，其他会话上传相同文件时直接复用
+        cache_keys = [DataUtils.parse_key(f, options) for f in uploaded_files]
+        dataset_id = DatasetStore.dataset_id(tuple(cache_keys))
+        store = get_dataset_store()
+        handle = store.get(dataset_id) if store is not None else None
+
+        start = time.perf_counter()
+        if handle is not None:
+            self.state.set_raw_handle(handle)
+            report = handle.attrs.get("batch_report", {})
+        else:
+            with st.spinner(f"正在并行解析 {len(uploaded_files)} 个文件..."):
+                progress_bar = st.progress(0.0, text="正在解析...")
+
+                def update_progress(fraction, name):
+                    progress_bar.progress(fraction, text=f"已完成: {name} ({fraction:.0%})")
+
+                df, report = DataUtils.load_many(
+                    uploaded_files, progress_callback=update_progress, cache_keys=cache_keys, **options
+                )
+                progress_bar.empty()
+                if df is not None and store is not None:
+                    df.attrs["batch_report"] = report
+                    self.state.set_raw_handle(store.put(dataset_id, df))
+                else:
+                    self.state.raw_df = df
+        total_time = time.perf_counter() - start
+
+        if not self.state.has_raw_data:
+            st.error("没有可导入的文件")
+            return
+
+        self.state.attach_dataset(dataset_id, options)
+        self.state.file_uploaded = True
+        st.success(f"已合并 {len(report)} 个文件，总耗时 {total_time:.2f} 秒")
+
+        # 每个文件的解析耗时和列差异
+        report_df = pd.DataFrame.from_dict(report, orient="index")
+        report_df.index.name = "文件名"
+        st.dataframe(report_df, use_container_width=True)
+        if (report_df["缺少的列"] != "").any():
+            st.warning("部分文件的列与其他文件不一致，合并结果中对应位置为空值")
+
+        self._display_data_summary(self.state.raw_df)
+        self._display_data_preview(self.state.raw_df)
+
     def _display_data_summary(self, df):
         """显示数据摘要信息"""
-        summary = DataUtils.get_data_summary(df)
+        # 原始数据的概况在清洗基础版本上计算一次，清洗和看板页面共用
+        summary = DataUtils.get_data_summary(df, self.state.base_cleaning_version().profile)
         
         st.subheader("数据概述")
 
@@ -291,7 +2251,7 @@ class DataImportModule:
         with container:
             # 添加只针对这个容器的CSS
             with st.expander("", expanded=True):
-                col1, col2, col3 = st.columns(3)
+                col1, col2, col3, col4 = st.columns(4)
                 with col1:
                     st.metric("总行数", summary["shape"][0])
                 with col2:
@@ -299,6 +2259,19 @@ class DataImportModule:
                 with col3:
                     missing_total = sum(summary["missing_values"].values())
                     st.metric("缺失值总数", missing_total)
+                with col4:
+                    # 压缩前后的内存占用
+                    compaction = df.attrs.get("compaction")
+                    if compaction:
+                        saved = compaction["before"] - compaction["after"]
+                        st.metric(
+                            "内存占用",
+                            f"{compaction['after'] / 1024 ** 2:.1f}MB",
+                            delta=f"-{saved / 1024 ** 2:.1f}MB（压缩前 {compaction['before'] / 1024 ** 2:.1f}MB）",
+                            delta_color="inverse"
+                        )
+                    else:
+                        st.metric("内存占用", f"{df.memory_usage(deep=True).sum() / 1024 ** 2:.1f}MB")
             
                 st.write("**列信息:**")
                 st.write(list(df.columns))
@@ -310,45 +2283,81 @@ class DataImportModule:
 
 # 数据清洗模块
 class DataCleaningModule:
+    # 各清洗步骤的参数控件，撤销后重做时恢复它们的取值
+    STEP_WIDGETS = {
+        "drop_rows": ["rows_to_drop"],
+        "drop_periods": ["periods_to_drop"],
+        "drop_where": ["drop_condition"],
+        "format": ["format_excel_dates", "apply_formatting"],
+        "impute": ["impute_numeric", "impute_text", "impute_strategy", "apply_imputation"]
+    }
+
     def __init__(self, state):
         self.state = state
+        self.version = None     # 本次运行中清洗流水线的当前版本
+        self.apply_formatting = False       # 表单中是否勾选了执行格式化
+        self.apply_imputation = False       # 表单中是否勾选了执行填充（不勾选时只预览）
+        # 选中的操作执行后显示结果（参数在清洗表单中填写）
         self.cleaning_options = {
             "删除包含空值的行": self.handle_missing_values,
             "删除重复值": self.handle_duplicates,
             #"删除指定列": self.handle_drop_columns,
             "删除指定行": self.handle_drop_rows,
+            "按时间范围删除": self.handle_drop_periods,
+            "按条件删除": self.handle_drop_where,
             #"数据格式化": self.handle_data_formatting,
             "缺失值填充": self.handle_missing_value_imputation
         }
+        # 需要参数的操作：在表单中渲染参数控件，返回该操作的清洗步骤（参数未填写时返回None）
+        self.option_params = {
+            "删除指定行": self._drop_rows_params,
+            "按时间范围删除": self._drop_periods_params,
+            "按条件删除": self._drop_where_params,
+            #"数据格式化": self._format_params,
+            "缺失值填充": self._imputation_params
+        }
     
     def render(self):
         st.header("🧹 数据清洗")
         
 
 
-        if not self.state.file_uploaded or self.state.raw_df is None:
+        if not self.state.file_uploaded or not self.state.has_raw_data:
             st.warning("请先在数据导入页面上传数据")
             return
         
-                # 显示原始数据摘要
-        self._display_data_summary(self.state.raw_df, "原始数据")
+        # 显示数据摘要（流水线执行后再填充内容）
+        summary_container = st.container()
         
-        # 初始化清洗后的数据
-        if self.state.cleaned_df is None:
-            self.state.cleaned_df = self.state.raw_df.copy()
+        # 以共享的原始数据为基础版本，每步清洗只记录变化
+        self.version = self.state.base_cleaning_version()
         
         # 清洗选项
         st.divider()
         st.subheader("清洗操作")
-        selected_options = st.multiselect(
-            "请选择具体操作",
-            options=list(self.cleaning_options.keys()),
-            key="cleaning_options"
-        )
+        history_container = st.container()
+        # 操作和参数在同一个表单中填写，点击“应用清洗”后一次执行（填写过程中页面不重新运行）
+        with st.form("cleaning_form"):
+            selected_options = st.multiselect(
+                "请选择具体操作",
+                options=list(self.cleaning_options.keys()),
+                key="cleaning_options"
+            )
+            steps = self._render_step_params()
+            st.form_submit_button("应用清洗", type="primary")
         
-        # 应用清洗操作
+        # 应用清洗操作：每个选中的操作是流水线中的一步，
+        # 结果按(输入版本, 参数)缓存，页面重新运行时不会重复执行
         for option in selected_options:
-            self.cleaning_options[option]()
+            self.cleaning_options[option](steps[option])
+        self.state.set_cleaned_version(self.version)
+        
+        # 撤销/重做按钮按本次执行后的版本显示
+        with history_container:
+            self._render_history_controls()
+            self._render_recipe_controls()
+        with summary_container:
+            self._display_data_summary(self.state.raw_df, "原始数据")
         
         #显示清洗结果
         #self._display_data_summary(self.state.cleaned_df, "清洗后数据")
@@ -375,19 +2384,232 @@ class DataCleaningModule:
         st.write("当前数据预览:")
         st.dataframe(self.state.cleaned_df, height=400)
     
-    def handle_missing_values(self):
+    def _render_history_controls(self):
+        """撤销/重做按钮"""
+        head = self.state.cleaned_version
+        col1, col2, col3 = st.columns([1, 1, 4])
+        with col1:
+            st.button("↩️ 撤销", on_click=self._undo, disabled=head is None or head.is_base,
+                      use_container_width=True, key="undo_cleaning")
+        with col2:
+            st.button("↪️ 重做", on_click=self._redo, disabled=not self.state.redo_stack,
+                      use_container_width=True, key="redo_cleaning")
+        with col3:
+            if head is not None and not head.is_base:
+                st.caption(f"可撤销: {head.label}（撤销数据 {self.state.undo_bytes / 1024 ** 2:.2f}MB）")
+
+    def _undo(self):
+        """撤销最后一步：恢复上一版本，并从操作列表中去掉该步骤"""
+        version = self.state.undo_cleaning()
+        if version is None:
+            return
+        # 按列的控件以"名称:列名"为key
+        names = self.STEP_WIDGETS.get(version.step.op, [])
+        widgets = {key: st.session_state[key] for key in st.session_state
+                   if isinstance(key, str) and key.split(":")[0] in names}
+        self.state.redo_stack.append((version, widgets))
+
+        # 去掉该步骤和排在它后面的操作：后面的操作本次没有产生版本（如没有空值可填充、
+        # 未填写要删除的行），留在列表中会在上一版本上重新执行，得不到上一版本
+        options = list(st.session_state.get("cleaning_options", []))
+        if version.label in options:
+            options = options[:len(options) - 1 - options[::-1].index(version.label)]
+        st.session_state["cleaning_options"] = options
+
+    def _redo(self):
+        """重做最近撤销的步骤：恢复操作列表和参数控件"""
+        if not self.state.redo_stack:
+            return
+        version, widgets = self.state.redo_stack.pop()
+        self.state.redo_cleaning(version)
+        st.session_state["cleaning_options"] = list(st.session_state.get("cleaning_options", [])) + [version.label]
+        for key, value in widgets.items():
+            st.session_state[key] = value
+
+    def _render_recipe_controls(self):
+        """保存当前的清洗步骤为配方文件，或加载配方文件填入清洗表单"""
+        with st.expander("清洗配方"):
+            head = self.state.cleaned_version
+            col1, col2 = st.columns([1, 2])
+            with col1:
+                pipeline = CleaningPipeline.from_version(head) if head is not None else CleaningPipeline()
+                # 配方同时记录原始数据的解析参数，批量清洗时按相同的类型导入
+                recipe = {"import": self.state.import_options, **pipeline.to_dict()}
+                st.download_button(
+                    "💾 保存配方",
+                    data=json.dumps(recipe, ensure_ascii=False, indent=2, default=str),
+                    file_name="cleaning_recipe.json",
+                    mime="application/json",
+                    disabled=not pipeline.steps,
+                    use_container_width=True,
+                    key="save_recipe"
+                )
+            with col2:
+                st.file_uploader("加载配方", type=["json"], on_change=self._load_recipe, key="recipe_file")
+            if st.session_state.get("recipe_error"):
+                st.error(st.session_state["recipe_error"])
+            st.caption("配方也可以用 batch_clean.py 批量应用到多个文件")
+
+    def _load_recipe(self):
+        """把配方中的步骤和参数填入清洗表单（每种操作只能出现一次，且需在界面中可用）"""
+        st.session_state["recipe_error"] = None
+        uploaded_file = st.session_state.get("recipe_file")
+        if uploaded_file is None:
+            return
+        try:
+            pipeline = CleaningPipeline.from_dict(json.loads(uploaded_file.getvalue().decode("utf-8")))
+            labels = [step.label for step in pipeline.steps]
+            for step in pipeline.steps:
+                if step.label not in self.cleaning_options:
+                    raise ValueError(f"界面中不支持“{step.label}”步骤")
+                if labels.count(step.label) > 1:
+                    raise ValueError(f"“{step.label}”在配方中出现了多次，界面中每种操作只能使用一次")
+            widgets = {}
+            for step in pipeline.steps:
+                widgets.update(self._recipe_widgets(step))
+        except Exception as e:
+            st.session_state["recipe_error"] = f"无法加载配方: {str(e)}"
+            return
+
+        # 按列的填充方法先恢复为默认，再填入配方中的取值
+        for key in list(st.session_state):
+            if isinstance(key, str) and key.startswith("impute_strategy:"):
+                st.session_state[key] = "默认"
+        for key, value in widgets.items():
+            st.session_state[key] = value
+        st.session_state["cleaning_options"] = labels
+        self.state.redo_stack.clear()
+
+    def _recipe_widgets(self, step):
+        """清洗步骤对应的参数控件取值"""
+        params = step.params
+        if step.op == "drop_rows":
+            return {"rows_to_drop": params.get("rows", "")}
+        if step.op == "drop_periods":
+            return {"periods_to_drop": params.get("periods", "")}
+        if step.op == "drop_where":
+            return {"drop_condition": params.get("expr", "")}
+        if step.op == "format":
+            return {"format_excel_dates": bool(params.get("excel_dates")), "apply_formatting": True}
+        if step.op == "impute":
+            numeric = params.get("numeric", "mean")
+            text = params.get("text", "mode")
+            if numeric not in CleaningOps.impute_strategies(numeric=True) \
+                    or text not in CleaningOps.impute_strategies(numeric=False):
+                raise ValueError(f"不可用的填充方法: {numeric}/{text}")
+            widgets = {"impute_numeric": numeric, "impute_text": text, "apply_imputation": True}
+            df = self.state.base_cleaning_version().materialize()
+            for col, strategy in params.get("strategies", {}).items():
+                if col not in df.columns:
+                    continue    # 本数据没有该列
+                if strategy not in CleaningOps.impute_strategies(pd.api.types.is_numeric_dtype(df[col])):
+                    raise ValueError(f"列“{col}”不能使用填充方法: {strategy}")
+                widgets[f"impute_strategy:{col}"] = strategy
+            return widgets
+        return {}
+
+    def _render_step_params(self):
+        """在表单中渲染各操作的参数控件，返回 操作名 -> 清洗步骤"""
+        ops = {label: op for op, label in CleaningOps.LABELS.items()}
+        steps = {}
+        for option in self.cleaning_options:
+            if option in self.option_params:
+                with st.expander(f"{option}参数"):
+                    steps[option] = self.option_params[option]()
+            else:
+                steps[option] = CleaningStep(ops[option])
+        return steps
+
+    def _drop_rows_params(self):
+        # 获取用户输入的行号（行号相对于上一步的结果）
+        row_input = st.text_input(
+            "输入要删除的行号（逗号分隔，支持范围如1-5）",
+            placeholder="例如: 1,3,5-8,10",
+            key="rows_to_drop"
+        )
+        return CleaningStep("drop_rows", {"rows": row_input}) if row_input else None
+
+    def _drop_periods_params(self):
+        period_input = st.text_input(
+            "输入要删除的时间范围（逗号分隔，年份表示整年，范围用~连接）",
+            placeholder="例如: 2015, 2018-03~2018-06",
+            key="periods_to_drop"
+        )
+        return CleaningStep("drop_periods", {"periods": period_input}) if period_input else None
+
+    def _drop_where_params(self):
+        condition = st.text_input(
+            "输入删除条件（列名含空格或符号时用`包围）",
+            placeholder="例如: `工业增加值` < 0 or `出口额`.isna()",
+            key="drop_condition"
+        )
+        return CleaningStep("drop_where", {"expr": condition}) if condition else None
+
+    def _format_params(self):
+        # 添加Excel日期序列号转换选项
+        st.info("如果第一列包含Excel日期序列号（如44682、44713等），请勾选下方选项")
+        is_excel_dates = st.checkbox("第一列是Excel日期序列号", key="format_excel_dates")
+        self.apply_formatting = st.checkbox("执行格式化", key="apply_formatting")
+        return CleaningStep("format", {"excel_dates": is_excel_dates})
+
+    def _imputation_params(self):
+        # 填充方法：数值列和其他列各有默认方法，可按列单独指定（列表按原始数据的缺失情况给出）
+        base = self.state.base_cleaning_version()
+        df = base.materialize()
+        missing_counts = base.profile.null_counts
+        missing_cols = missing_counts[missing_counts > 0]
+
+        strategy_label = CleaningOps.IMPUTE_STRATEGIES.get
+        has_time_axis = CleaningOps.month_axis(df) is not None
+        numeric_options = CleaningOps.impute_strategies(numeric=True)
+        text_options = CleaningOps.impute_strategies(numeric=False)
+        # 默认值写入会话状态而不是index参数，重做和加载配方时才能直接设置控件取值
+        st.session_state.setdefault("impute_numeric", "linear" if has_time_axis else "mean")
+        st.session_state.setdefault("impute_text", "mode")
+        col1, col2 = st.columns(2)
+        with col1:
+            numeric_default = st.selectbox(
+                "数值列填充方法", numeric_options, format_func=strategy_label, key="impute_numeric"
+            )
+        with col2:
+            text_default = st.selectbox(
+                "其他列填充方法", text_options, format_func=strategy_label, key="impute_text"
+            )
+        if not has_time_axis:
+            st.caption("第一列不是时间类型，按时间的方法将按行顺序计算")
+
+        strategies = {}
+        if not missing_cols.empty:
+            st.write("按列指定填充方法:")
+            grid = st.columns(3)
+            for i, col in enumerate(missing_cols.index):
+                options = ["默认"] + CleaningOps.impute_strategies(pd.api.types.is_numeric_dtype(df[col]))
+                with grid[i % 3]:
+                    choice = st.selectbox(
+                        f"{col}（缺失 {missing_cols[col]} 个）", options,
+                        format_func=lambda s: CleaningOps.IMPUTE_STRATEGIES.get(s, s),
+                        key=f"impute_strategy:{col}"
+                    )
+                if choice != "默认":
+                    strategies[col] = choice
+
+        self.apply_imputation = st.checkbox("执行填充（不勾选时只预览各方法的填充数量）", key="apply_imputation")
+        return CleaningStep("impute", {"numeric": numeric_default, "text": text_default, "strategies": strategies})
+
+    def _apply_step(self, step):
+        """执行流水线中的一步，返回结果版本"""
+        self.version = CleaningPipeline.apply_step(self.version, step, self.state.version_memo)
+        return self.version
+
+    def handle_missing_values(self, step):
         """处理缺失值"""
-        initial_count = len(self.state.cleaned_df)
-        self.state.cleaned_df = self.state.cleaned_df.dropna()
-        removed_count = initial_count - len(self.state.cleaned_df)
-        st.success(f"删除了 {removed_count} 行包含空值的记录")
+        version = self._apply_step(step)
+        st.success(f"删除了 {version.stats['removed']} 行包含空值的记录")
 
-    def handle_duplicates(self):
+    def handle_duplicates(self, step):
         """处理重复值"""
-        initial_count = len(self.state.cleaned_df)
-        self.state.cleaned_df = self.state.cleaned_df.drop_duplicates()
-        removed_count = initial_count - len(self.state.cleaned_df)
-        st.success(f"删除了 {removed_count} 条重复记录")
+        version = self._apply_step(step)
+        st.success(f"删除了 {version.stats['removed']} 条重复记录")
 
     # 待开发
     # def handle_drop_columns(self):
@@ -403,148 +2625,99 @@ class DataCleaningModule:
     #         st.success(f"已删除列: {', '.join(cols_to_drop)}")
 
 #========================================================================
-    def handle_drop_rows(self):
+    def handle_drop_rows(self, step):
         """删除指定行"""
         st.subheader("删除指定行")
         
-        # 获取用户输入的行号
-        row_input = st.text_input(
-            "输入要删除的行号（逗号分隔，支持范围如1-5）",
-            placeholder="例如: 1,3,5-8,10",
-            key="rows_to_drop"
-        )
-        
-        if row_input:
-            try:
-                # 解析用户输入的行号
-                rows_to_drop = self._parse_row_input(row_input, len(self.state.cleaned_df))
-                
-                if rows_to_drop:
-                    # 保存原始行数用于统计
-                    initial_count = len(self.state.cleaned_df)
-                    
-                    # 删除指定行
-                    self.state.cleaned_df = self.state.cleaned_df.drop(rows_to_drop)
-                    
-                    # 重置索引
-                    self.state.cleaned_df.reset_index(drop=True, inplace=True)
-                    
-                    # 显示操作结果
-                    removed_count = initial_count - len(self.state.cleaned_df)
-                    st.success(f"已删除 {removed_count} 行数据")
-                    
-                    # # 显示删除后的数据预览
-                    # st.write("删除后数据预览:")
-                    # st.dataframe(self.state.cleaned_df, height=200)
-                    # print(self.state.cleaned_df)
-                else:
-                    st.warning("未找到有效的行号，请检查输入格式")
-            except Exception as e:
-                st.error(f"处理行号时出错: {str(e)}")
-    
-    def _parse_row_input(self, input_str, max_row):
-        """解析用户输入的行号"""
-        rows_to_drop = set()
-        
-        # 按逗号分割不同的行号范围
-        parts = input_str.split(',')
-        for part in parts:
-            part = part.strip()
-            if '-' in part:
-                # 处理范围 (如 1-5)
-                range_parts = part.split('-')
-                if len(range_parts) == 2:
-                    try:
-                        start = int(range_parts[0].strip())
-                        end = int(range_parts[1].strip())
-                        if 0 <= start <= end < max_row:
-                            rows_to_drop.update(range(start, end + 1))
-                    except ValueError:
-                        continue
+        if step is None:
+            st.info("请在上方参数中输入要删除的行号")
+            return
+        try:
+            version = self._apply_step(step)
+            
+            if version.stats["removed"]:
+                # 显示操作结果
+                st.success(f"已删除 {version.stats['removed']} 行数据")
             else:
-                # 处理单个行号
-                try:
-                    row_num = int(part.strip())
-                    if 0 <= row_num < max_row:
-                        rows_to_drop.add(row_num)
-                except ValueError:
-                    continue
-        
-        return list(rows_to_drop)
+                st.warning("未找到有效的行号，请检查输入格式")
+        except Exception as e:
+            st.error(f"处理行号时出错: {str(e)}")
+
+    def handle_drop_periods(self, step):
+        """按时间范围删除"""
+        st.subheader("按时间范围删除")
+
+        if step is None:
+            st.info("请在上方参数中输入要删除的时间范围")
+            return
+        try:
+            version = self._apply_step(step)
+            if version.stats["removed"]:
+                st.success(f"已删除 {version.stats['removed']} 行数据")
+            else:
+                st.warning("没有落在该时间范围内的行")
+        except Exception as e:
+            st.error(f"处理时间范围时出错: {str(e)}")
+
+    def handle_drop_where(self, step):
+        """按条件表达式删除"""
+        st.subheader("按条件删除")
+
+        if step is None:
+            st.info("请在上方参数中输入删除条件")
+            return
+        try:
+            version = self._apply_step(step)
+            if version.stats["removed"]:
+                st.success(f"已删除 {version.stats['removed']} 行满足条件的数据")
+            else:
+                st.warning("没有满足条件的行")
+        except Exception as e:
+            st.error(f"条件表达式有误: {str(e)}")
 
-    def handle_data_formatting(self):
+    def handle_data_formatting(self, step):
         """数据格式化：第一列转时间，其余列转数值型"""
         st.subheader("数据格式化")
         
-        if self.state.cleaned_df is None or self.state.cleaned_df.empty:
+        # 只用概况和数据类型判断和显示，不重建输入数据
+        profile = self.version.profile
+        if profile.num_rows == 0 or not profile.columns:
             st.warning("没有可格式化的数据")
             return
             
         # 显示当前数据类型
         st.write("当前数据类型:")
+        dtypes = self.version.dtypes
         dtype_info = pd.DataFrame({
-            "列名": self.state.cleaned_df.columns,
-            "当前类型": self.state.cleaned_df.dtypes.astype(str)
+            "列名": profile.columns,
+            "当前类型": dtypes.astype(str)
         })
         st.dataframe(dtype_info, hide_index=True)
         
-        # 添加Excel日期序列号转换选项
-        st.info("如果第一列包含Excel日期序列号（如44682、44713等），请勾选下方选项")
-        is_excel_dates = st.checkbox("第一列是Excel日期序列号")
-        
-        # 执行格式化操作
-        if st.button("执行格式化"):
+        # 执行格式化操作（勾选后作为流水线的一步保留，页面重新运行时不会重复转换）
+        if self.apply_formatting:
             try:
-                # 创建原始数据的副本用于比较
-                original_df = self.state.cleaned_df.copy()
-                
-                # 转换第一列为时间类型
-                first_col = self.state.cleaned_df.columns[0]
-                
-                if is_excel_dates:
-                    # 处理Excel日期序列号
-                    # Excel日期是从1900-01-01开始的天数
-                    # 使用origin='1899-12-30'来校正Excel的日期偏移错误
-                    self.state.cleaned_df[first_col] = pd.to_datetime(
-                        self.state.cleaned_df[first_col].astype(float), 
-                        unit='D', 
-                        origin='1899-12-30',
-                        errors='coerce'
-                    )
-                else:
-                    # 常规时间转换
-                    self.state.cleaned_df[first_col] = pd.to_datetime(
-                        self.state.cleaned_df[first_col], 
-                        errors='coerce'
-                    )
-                
-                # 转换其余列为数值型
-                other_cols = self.state.cleaned_df.columns[1:]
-                for col in other_cols:
-                    self.state.cleaned_df[col] = pd.to_numeric(
-                        self.state.cleaned_df[col], 
-                        errors='coerce'
-                    )
+                version = self._apply_step(step)
+                first_col = profile.columns[0]
                 
                 # 显示格式化结果
                 st.success("数据格式化完成！")
                 
                 # 显示转换前后的数据类型对比
                 st.write("数据类型变化:")
+                formatted_df = version.materialize()
                 dtype_changes = pd.DataFrame({
-                    "列名": self.state.cleaned_df.columns,
-                    "原始类型": original_df.dtypes.astype(str),
-                    "新类型": self.state.cleaned_df.dtypes.astype(str)
+                    "列名": formatted_df.columns,
+                    "原始类型": dtypes.astype(str),
+                    "新类型": formatted_df.dtypes.astype(str)
                 })
                 st.dataframe(dtype_changes, hide_index=True)
                 
-                # 显示转换失败的统计
-                failed_conversions = {}
-                for col in self.state.cleaned_df.columns:
-                    na_count = self.state.cleaned_df[col].isna().sum()
-                    original_na = original_df[col].isna().sum()
-                    failed_conversions[col] = na_count - original_na
+                if version.stats.get("scaled"):
+                    st.info(f"已按万/亿单位换算 {version.stats['scaled']} 个数值")
                 
+                # 显示转换失败的统计
+                failed_conversions = version.stats["failed"]
                 if any(failed_conversions.values()):
                     st.warning("部分数据转换失败:")
                     for col, count in failed_conversions.items():
@@ -555,130 +2728,193 @@ class DataCleaningModule:
                 st.write("格式化后数据预览:")
                 
                 # 创建格式化后的预览数据（时间列格式化为年月）
-                preview_df = self.state.cleaned_df.copy()
+                preview_df = formatted_df.head().copy()
                 
                 # 如果第一列是日期类型，格式化为年月
                 if pd.api.types.is_datetime64_any_dtype(preview_df[first_col]):
                     preview_df[first_col] = preview_df[first_col].dt.strftime('%Y年%m月')
                 
-                st.dataframe(preview_df.head(), height=200)
+                st.dataframe(preview_df, height=200)
                 
                 # 添加日期范围信息
-                if pd.api.types.is_datetime64_any_dtype(self.state.cleaned_df[first_col]):
-                    min_date = self.state.cleaned_df[first_col].min()
-                    max_date = self.state.cleaned_df[first_col].max()
+                if pd.api.types.is_datetime64_any_dtype(formatted_df[first_col]):
+                    min_date = formatted_df[first_col].min()
+                    max_date = formatted_df[first_col].max()
                     st.info(f"时间范围: {min_date.strftime('%Y年%m月')} 至 {max_date.strftime('%Y年%m月')}")
                 
             except Exception as e:
                 st.error(f"格式化过程中出错: {str(e)}")
 
-    def handle_missing_value_imputation(self):
-        """缺失值填充：时间列按时间填充，数值列用均值填充"""
+    def handle_missing_value_imputation(self, step):
+        """缺失值填充：按列选择填充方法，预览各方法的填充数量后执行"""
         st.subheader("缺失值填充")
         
-        if self.state.cleaned_df is None or self.state.cleaned_df.empty:
+        profile = self.version.profile
+        if profile.num_rows == 0 or not profile.columns:
             st.warning("没有可填充的数据")
             return
             
         # 显示缺失值统计
-        missing_counts = self.state.cleaned_df.isnull().sum()
+        missing_counts = profile.null_counts
         missing_cols = missing_counts[missing_counts > 0]
         
         if missing_cols.empty:
             st.success("数据中没有缺失值，无需填充")
             return
-            
+
+        strategy_label = CleaningOps.IMPUTE_STRATEGIES.get
+        try:
+            # 预览：只计算填充位置和填充值，不生成新数据
+            preview = CleaningPipeline.prepare(self.version, step, self.state.version_memo)
+        except Exception as e:
+            st.error(f"填充过程中出错: {str(e)}")
+            return
+
         st.write("各列缺失值数量:")
         missing_df = pd.DataFrame({
             "列名": missing_cols.index,
-            "缺失值数量": missing_cols.values
+            "缺失值数量": missing_cols.values,
+            "可填充数量": [preview.stats["by_column"].get(col, 0) for col in missing_cols.index]
         })
         st.dataframe(missing_df, hide_index=True)
+        st.write("各填充方法的填充数量:")
+        st.dataframe(pd.DataFrame({
+            "填充方法": [strategy_label(s, s) for s in preview.stats["by_strategy"]],
+            "填充数量": list(preview.stats["by_strategy"].values())
+        }), hide_index=True)
+        if preview.stats["remaining"]:
+            st.caption(f"有 {preview.stats['remaining']} 个缺失值无法填充（如首尾缺失无法插值），将保留为空值")
         
-        # 执行填充操作
-        if st.button("执行填充"):
+        # 执行填充操作（勾选后作为流水线的一步保留）
+        if not self.apply_imputation:
+            st.caption("在参数中勾选“执行填充”并应用后生效")
+        else:
             try:
-                # 创建填充前的数据副本用于比较
-                original_df = self.state.cleaned_df.copy()
-     
-                # 填充其他列
-                for col in self.state.cleaned_df.columns:
-
-                    # 数值列使用均值填充
-                    if pd.api.types.is_numeric_dtype(self.state.cleaned_df[col]):
-                        mean_val = self.state.cleaned_df[col].mean()
-                        self.state.cleaned_df[col] = self.state.cleaned_df[col].fillna(mean_val)
-                    # 其他类型使用众数填充
-                    else:
-                        mode_val = self.state.cleaned_df[col].mode()[0] if not self.state.cleaned_df[col].mode().empty else None
-                        if mode_val is not None:
-                            self.state.cleaned_df[col] = self.state.cleaned_df[col].fillna(mode_val)
+                version = self._apply_step(step)
+                filled_df = version.materialize()
                 
                 # 显示填充结果
                 st.success("缺失值填充完成！")
                 
-                # 显示填充前后的缺失值对比
-                original_missing = original_df.isnull().sum().sum()
-                new_missing = self.state.cleaned_df.isnull().sum().sum()
-                filled_count = original_missing - new_missing
-                
-                st.info(f"共填充了 {filled_count} 个缺失值")
+                st.info(f"共填充了 {version.stats['filled']} 个缺失值")
                 st.write("填充后缺失值统计:")
-                st.dataframe(self.state.cleaned_df.isnull().sum().to_frame("缺失值数量").T)
+                st.dataframe(version.profile.null_counts.to_frame("缺失值数量").T)
                 
                 # 显示填充后的数据预览
                 st.write("填充后数据预览:")
-                st.dataframe(self.state.cleaned_df, height=200)
+                st.dataframe(filled_df, height=200)
                 
             except Exception as e:
                 st.error(f"填充过程中出错: {str(e)}")
 #  ==============================================================      
 
     
+    @st.fragment
     def _render_export_section(self):
-        """渲染数据导出部分"""
+        """渲染数据导出部分（修改导出选项时只重新运行本部分）"""
         st.subheader("数据导出")
         
         if self.state.cleaned_df is not None:
             # 导出选项
-            export_format = st.radio("导出格式", ["CSV", "Excel"], horizontal=True)
-            
+            export_format = st.radio("导出格式", DataExporter.available_formats(), horizontal=True)
+            options = {}
             if export_format == "CSV":
-                file_name = st.text_input("文件名", "cleaned_data.csv")
-                csv = self.state.cleaned_df.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="下载CSV文件",
-                    data=csv,
-                    file_name=file_name,
-                    mime='text/csv'
+                options["gzip"] = st.checkbox("gzip压缩", key="export_gzip")
+            elif export_format == "Parquet":
+                options["compression"] = st.selectbox(
+                    "压缩方式", DataExporter.PARQUET_COMPRESSIONS, key="export_parquet_compression"
                 )
-            else:
-                file_name = st.text_input("文件名", "cleaned_data.xlsx")
-                # 创建内存文件流
-                output = BytesIO()
-                # 将数据写入内存流（而非直接返回）
-                self.state.cleaned_df.to_excel(output, index=False, engine='openpyxl')
-                # 将文件指针移到开头（否则下载的文件会为空）
-                output.seek(0)
+            if export_format in DataExporter.COLUMNAR_FORMATS:
+                st.caption("列式格式保留指标名称的月度类型、分类列和float32列，下游读取时无需重新解析")
+            extension, mime = DataExporter.file_info(export_format, options)
+            file_name = st.text_input("文件名", f"cleaned_data{extension}")
 
-                st.download_button(
-                    label="下载Excel文件",
-                    data=output,
-                    file_name=file_name,
-                    mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                )
+            # 点击下载时才生成文件（在后台线程中执行），按版本缓存
+            version = self.state.cleaned_version
+            cache = get_export_cache()
+            st.download_button(
+                label=f"下载{export_format}文件",
+                data=lambda: DataExporter.export(version, export_format, options, cache).read(),
+                file_name=file_name,
+                mime=mime
+            )
 
 # 数据看板模块
+# =======图表缓存==========================
+FIGURE_CACHE_MAX_ENTRIES = 256      # 图表缓存的图表数上限
+
+# 图表缓存：按(数据版本, 图表名, 图表控件取值)缓存生成的Plotly图表，按条目数淘汰
+class FigureCache(LRUCache):
+    def __init__(self, max_entries=FIGURE_CACHE_MAX_ENTRIES):
+        super().__init__(max_entries)
+
+    @staticmethod
+    def make_key(data_key, chart_name, widget_values):
+        return (data_key, chart_name, widget_values)
+
+# 整个服务进程只创建一个图表缓存（版本ID由数据内容和清洗步骤决定，各会话可共用）
+@st.cache_resource
+def get_figure_cache():
+    return FigureCache()
+
+PIE_TABLE_CACHE_MAX_BYTES = 128 * 1024 * 1024      # 饼图数据表缓存上限
+
+# 饼图数据表：看板数据中按指标名称定位行的索引，以及全部预设饼图的构成（各部分金额和“其他”）
+class PieTable:
+    def __init__(self, df, pie_configs):
+        # 指标名称 -> 第一次出现的行位置（与逐行比较取第一行的结果相同）
+        periods = pd.Index(df["指标名称"])
+        first = ~periods.duplicated()
+        self.positions = dict(zip(periods[first], np.flatnonzero(first)))
+
+        # 所有饼图用到的列一次性转为数值矩阵，再按图表取列计算（含非数值列的饼图不计算）
+        pie_configs = {
+            name: config for name, config in pie_configs.items()
+            if all(pd.api.types.is_numeric_dtype(df[col]) for col in [config["x_axis"]] + config["columns"])
+        }
+        columns = list(dict.fromkeys(
+            col for config in pie_configs.values() for col in [config["x_axis"]] + config["columns"]
+        ))
+        values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan) if columns \
+            else np.empty((len(df), 0))
+        column_pos = {col: i for i, col in enumerate(columns)}
+        self.compositions = {}      # 图表名 -> (总额, 各部分金额(行数×部分数), 其他)
+        for chart_name, config in pie_configs.items():
+            total = values[:, column_pos[config["x_axis"]]]
+            parts = values[:, [column_pos[col] for col in config["columns"]]]
+            self.compositions[chart_name] = (total, parts, total - parts.sum(axis=1))
+
+    @property
+    def nbytes(self):
+        return sum(total.nbytes + parts.nbytes + other.nbytes
+                   for total, parts, other in self.compositions.values()) + 100 * len(self.positions)
+
+    def row(self, chart_name, selected_row):
+        """饼图在选中行的(总额, 各部分金额, 其他)"""
+        position = self.positions[selected_row]
+        total, parts, other = self.compositions[chart_name]
+        return total[position], parts[position], other[position]
+
+# 饼图数据表缓存：按看板数据(数据版本, 时间范围)缓存，各会话共用
+class PieTableCache(LRUCache):
+    def __init__(self, max_bytes=PIE_TABLE_CACHE_MAX_BYTES):
+        super().__init__(max_bytes, sizeof=lambda table: table.nbytes)
+
+@st.cache_resource
+def get_pie_table_cache():
+    return PieTableCache()
+
 class DashboardModule:
     def __init__(self, state):
         self.state = state
-        # 预设图表配置
-        self.CHART_CONFIG = CHART_CONFIG
+        # 预设图表（由CHART_CONFIG编译一次，各会话共用）
+        self.charts = get_chart_catalog()
+        self.data_key = None        # 看板数据的标识：(数据版本ID, 时间范围)
     
     def render(self):
         st.header("📊 数据看板")
         
-        if not self.state.file_uploaded or self.state.raw_df is None:
+        if not self.state.file_uploaded or not self.state.has_raw_data:
             st.warning("请先在数据导入页面上传数据")
             return
         
@@ -690,25 +2926,63 @@ class DashboardModule:
             index=1 if self.state.cleaned_df is not None else 0
         )
         
-        df = self.state.cleaned_df if data_source == "清洗后数据" and self.state.cleaned_df is not None else self.state.raw_df
+        if data_source == "清洗后数据" and self.state.cleaned_df is not None:
+            version = self.state.cleaned_version
+        else:
+            version = self.state.base_cleaning_version()
+        full_df = version.materialize()
+
+        # 按时间范围筛选
+        self.data_key = (version.version_id, None)
+        df = self._render_period_filter(full_df)
 
         # 显示数据摘要
         st.subheader("数据摘要")
-        self._display_data_summary(df)
+        self._display_data_summary(df, self._profile_of(df, full_df, version))
         st.dataframe(df, height=300, use_container_width=True)
 
+        # 图表使用时间戳形式的指标名称
+        chart_df = DataUtils.to_chart_frame(df)
+
         # 自定义图表制作
         st.divider()
         st.subheader("自定义图表制作")
-        self._render_custom_charts(df)
+        self._render_custom_charts(chart_df)
         
         # 预设图表展示
         st.divider()
-        self._render_preset_charts(df)
+        self._render_preset_charts(chart_df)
+
+    def _render_period_filter(self, df):
+        """按指标名称选择时间范围"""
+        if not DataUtils.has_period_axis(df):
+            return df
+
+        df = DataUtils.sort_by_period(df)
+        options = [str(p) for p in df['指标名称'].unique()]
+        if len(options) < 2:
+            return df
+
+        start, end = st.select_slider(
+            "时间范围",
+            options=options,
+            value=(options[0], options[-1]),
+            key="dashboard_period_range"
+        )
+        self.data_key = (self.data_key[0], (start, end))
+        return DataUtils.slice_periods(df, pd.Period(start, freq='M'), pd.Period(end, freq='M'))
     
-    def _display_data_summary(self, df):
+    def _profile_of(self, df, full_df, version):
+        """筛选后数据的概况：从版本的概况中按行位置取子集，不重新扫描数据"""
+        if df is full_df:
+            return version.profile
+        if full_df.index.equals(pd.RangeIndex(len(full_df))):
+            return version.profile.take(df.index.to_numpy())
+        return DatasetProfile.from_frame(df)
+
+    def _display_data_summary(self, df, profile):
         """显示数据摘要"""
-        summary = DataUtils.get_data_summary(df)
+        summary = DataUtils.get_data_summary(df, profile)
         
         cols = st.columns(4)
         with cols[0]:
@@ -719,8 +2993,7 @@ class DashboardModule:
             missing_total = sum(summary["missing_values"].values())
             st.metric("缺失值", missing_total)
         with cols[3]:
-            duplicates = df.duplicated().sum()
-            st.metric("重复值", duplicates)
+            st.metric("重复值", profile.duplicate_count)
         
         # # 数据类型分布
         # with st.expander("数据类型分布"):
@@ -796,6 +3069,7 @@ class DashboardModule:
             "选择数据行",
             options=df["指标名称"],
             index=1 if len(row_options) > 1 else 0,
+            format_func=DataUtils.format_period,
             key="pie_row_select"
         )
         
@@ -808,7 +3082,7 @@ class DashboardModule:
         )
         
         # 图表标题
-        chart_title = st.text_input("图表标题", f"{selected_row} 饼图")
+        chart_title = st.text_input("图表标题", f"{DataUtils.format_period(selected_row)} 饼图")
         
         # 生成图表按钮
         if st.button("生成饼图", key="generate_pie_btn"):
@@ -894,11 +3168,11 @@ class DashboardModule:
     def _draw_pie_chart(self, df, cols, selected_row, title):
         """绘制饼图"""
         try:
-            # 获取选中的行数据
-            row_data = df[df["指标名称"] == selected_row].iloc[0]
+            # 按指标名称索引定位选中的行
+            position = self._pie_table(df).positions[selected_row]
             
             # 获取各部分的值
-            values = [row_data[col] for col in cols]
+            values = [df[col].iat[position] for col in cols]
             labels = [f"{col} ({val})" for col, val in zip(cols, values)]
             
             # 创建饼图
@@ -960,21 +3234,36 @@ class DashboardModule:
 
 #==========================================================================
     def _render_preset_charts(self, df):
-        """渲染预设图表展示功能"""
+        """渲染预设图表展示功能：按指标组显示，只计算选中的组"""
         st.subheader("预设图表展示")
+
+        # 指标组按配置中首次出现的顺序排列
+        groups = list(self.charts.groups)
+        selected_groups = st.pills(
+            "选择要显示的指标组",
+            groups,
+            selection_mode="multi",
+            default=groups[:1],
+            key="preset_chart_groups"
+        )
+        if not selected_groups:
+            st.info("请选择要显示的指标组")
+            return
+
+        for group in groups:
+            if group in selected_groups:
+                self._render_chart_group(df, group)
+
+    @st.fragment
+    def _render_chart_group(self, df, group):
+        """渲染一个指标组的图表（组内图表的控件变化时只重新运行本组）"""
+        st.markdown(f"### {group}")
         
-        # 1. 筛选有效的图表配置
-        valid_charts = {}
-        missing_charts = []
-        
-        for chart_name, config in self.CHART_CONFIG.items():
-            required_cols = [config["x_axis"]] + config["columns"]
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            
-            if not missing_cols:
-                valid_charts[chart_name] = config
-            else:
-                missing_charts.append((chart_name, missing_cols))
+        # 1. 按数据的列名查找有效的图表（同一组列名只解析一次）
+        schema = self.charts.resolve(df.columns)
+        chart_names = self.charts.groups[group]
+        valid_charts = {name: schema.valid[name] for name in chart_names if name in schema.valid}
+        missing_charts = [(name, schema.missing[name]) for name in chart_names if name in schema.missing]
         
         # 2. 显示缺失图表的警告信息
         if missing_charts:
@@ -988,7 +3277,7 @@ class DashboardModule:
         num_valid = len(valid_keys)
         
         if num_valid == 0:
-            st.info("没有有效的图表可以显示")
+            st.info("该组没有有效的图表可以显示")
             return
         
        # 计算需要多少行（每行最多2个图表）
@@ -1003,282 +3292,282 @@ class DashboardModule:
                     config = valid_charts[chart_name]
                     
                     with cols[col_idx]:
-                        st.markdown(f"### {chart_name}")
+                        st.markdown(f"#### {chart_name}")
+                        self._render_preset_chart(df, chart_name, config)
+
+    def _render_preset_chart(self, df, chart_name, config):
+        """渲染一个预设图表：Plotly图表按(数据版本, 图表名, 图表控件取值)缓存，只重建输入有变化的图表"""
 #================================ 添加图标类型==================================
-                        #折线图
-                        if config["type"] == "line":
-                            st.line_chart(
-                                data=df,
-                                x=config["x_axis"],
-                                y=config["columns"]
-                            )
-                        # 柱状图
-                        elif config["type"] == "bar":
-                            st.bar_chart(
-                                data=df,
-                                x=config["x_axis"],
-                                y=config["columns"]
-                            )
-                                        
-                        # 散点图
-                        elif config["type"] == "scatter":
-                            # 把数据重构为长格式
-                            fig = px.scatter(
-                                data_frame=df,
-                                x=config["x_axis"],
-                                y=config["columns"],
-                                color="variable",  # 依据原始列名进行颜色区分
-                                labels={"value": config["columns"][0],"variable": "数值"}  # 自定义标签
-                            )
-                            st.plotly_chart(fig, use_container_width=True) 
-             
-                        # # 饼图
-                        elif config["type"] == "pie":
-                            # 获取总额列名和部分金额列名
-                            total_col = config["x_axis"]
-                            part_cols = config["columns"]
-
-                            # 检查列是否存在
-                            if total_col not in df.columns or not all(col in df.columns for col in part_cols):
-                                st.warning(f"缺少必要的列: {total_col} 或 {', '.join(part_cols)}")
-                                continue
-                            
-                            #让用户选择行（默认为第二行）
-                            #row_options = list(range(len(df)))
-                            selected_row = st.selectbox(
-                                "选择数据行",
-                                options=df["指标名称"],
-                                #index=1 if len(row_options) > 1 else df["指标名称"][0],
-                                key=f"row_select_{chart_name}"
-                            )
-                            row_data = df[df["指标名称"]== selected_row]
-                            row_data = row_data.iloc[0]
-
-                            # row_options = list(range(len(df)))
-                            # selected_row = st.selectbox(
-                            #     f"选择数据行 ({chart_name})",
-                            #     options=row_options,
-                            #     index=1 if len(row_options) > 1 else 0,
-                            #     key=f"row_select_{chart_name}"
-                            # )
-                            # row_data = df.iloc[selected_row]
-                            # 获取总额值
-                            total_value = row_data[total_col]
-                            
-                            # 计算各部分金额
-                            part_values = []
-                            part_labels = []
-                            for col in part_cols:
-                                value = row_data[col]
-                                part_values.append(value)
-                                part_labels.append(f"{col} ({value:.2f})")
-                            
-                            # 计算"其他"部分
-                            parts_sum = sum(part_values)
-                            other_value = total_value - parts_sum
-                            if other_value > 0:
-                                part_values.append(other_value)
-                                part_labels.append(f"其他 ({other_value:.2f})")
-                            
-                            # 创建饼图
-                            fig = px.pie(
-                                values=part_values,
-                                names=part_labels,
-                                title=f"{chart_name}",
-                                hover_data=[part_values],
-                                hole=0.3  # 中间留空，形成环形图
-                            )
-                            
-                            # 添加总额注释
-                            fig.update_layout(
-                                annotations=[
-                                    dict(
-                                        text=f'总额: {total_value:.2f}',
-                                        showarrow=False,
-                                        x=0.5, y=0.5,
-                                        font_size=14
-                                    )
-                                ]
-                            )
-                            
-                            # 显示图表
-                            st.plotly_chart(fig, use_container_width=True)
-                        #面积图
-                        elif config["type"] == "area":
-                            st.area_chart(
-                                data=df,
-                                x=config["x_axis"],
-                                y=config["columns"]
-                            )
-
-                        # 热力图
-                        elif config["type"] == "correlation_heatmap":
-                            # 检查所需列是否存在
-                            available_cols = [col for col in config["columns"] 
-                                            if col in df.columns]
-                            missing_cols = [col for col in config["columns"] 
-                                          if col not in df.columns]
-                            
-                            if not available_cols:
-                                st.warning(f"所有指定列都不存在: {', '.join(config['columns'])}")
-                                continue
-                            
-                            if missing_cols:
-                                st.warning(f"以下列不存在，已跳过: {', '.join(missing_cols)}")
-                            
-                            # 计算相关性矩阵
-                            correlation_df = df[available_cols].corr()
-                            
-                            # 创建热力图
-                            fig = px.imshow(
-                                correlation_df,
-                                text_auto=".2f",  # 在单元格中显示两位小数的数值
-                                color_continuous_scale="RdBu_r",  # 红蓝对比色，反转以使正相关为蓝色
-                                aspect="auto",  # 自动调整宽高比
-                                labels=dict(color="相关系数"),
-                                zmin=-1,  # 设置最小值为-1
-                                zmax=1    # 设置最大值为1
-                            )
-                            
-                            # 设置布局
-                            fig.update_layout(
-                                xaxis_title="指标",
-                                yaxis_title="指标",
-                                height=max(400, 100 * len(available_cols)),  # 根据指标数量调整高度
-                                width=max(500, 150 * len(available_cols))    # 根据指标数量调整宽度
-                            )
-                            
-                            # 添加自定义悬停文本
-                            fig.update_traces(
-                                hovertemplate=(
-                                    "指标1: %{y}<br>" +
-                                    "指标2: %{x}<br>" +
-                                    "相关系数: %{z:.3f}<extra></extra>"
-                                )
-                            )
-                            
-                            st.plotly_chart(fig, use_container_width=True)
-                        # 箱线图
-                        # elif config["type"] == "box":
-                        #     fig = px.box(
-                        #         df,
-                        #         y=config["columns"],
-                        #         x=config.get("x_axis", None),
-                        #         color=config.get("color_column", None),
-                        #         title=chart_name
-                        #     )
-                        #     st.plotly_chart(fig, use_container_width=True)
-                        # 在现有的图表类型判断条件中添加以下代码：
-                        elif config["type"] == "grouped_bar":
-                            # 准备数据
-                            fig = go.Figure()
-                            
-                            # 颜色设置
-                            colors = ['#636EFA', '#EF553B']  # A组和B组颜色
-                            
-                            # 计算x轴位置
-                            x_positions = list(range(len(df[config["x_axis"]].unique())))
-                            a_positions = [x - 0.15 for x in x_positions]  # A组向左偏移
-                            b_positions = [x + 0.15 for x in x_positions]  # B组向右偏移
-                            
-                            # 绘制A组柱子
-                            fig.add_trace(go.Bar(
-                                x=a_positions,
-                                y=df[config["columns"][0]],
-                                name=config["group_names"][0],
-                                marker_color=colors[0],
-                                width=0.3,
-                                text=df[config["columns"][0]],  # 显示数值标签
-                                textposition='outside'
-                            ))
-                            
-                            # 绘制B组柱子
-                            fig.add_trace(go.Bar(
-                                x=b_positions,
-                                y=df[config["columns"][1]],
-                                name=config["group_names"][1],
-                                marker_color=colors[1],
-                                width=0.3,
-                                text=df[config["columns"][1]],  # 显示数值标签
-                                textposition='outside'
-                            ))
-                            
-                            # 更新布局
-                            fig.update_layout(
-                                barmode='group',  # 关键设置：分组模式
-                                #title=chart_name,
-                                xaxis={
-                                    'tickvals': x_positions,
-                                    'ticktext': df[config["x_axis"]].unique(),
-                                    'title': config["x_axis"]
-                                },
-                                yaxis={'title': '数值'},
-                                hovermode='x unified',
-                                bargap=0.2,
-                                bargroupgap=0.1  # 组内柱子间距
-                            )
-                            
-                            st.plotly_chart(fig, use_container_width=True)
-
-                                                # 双轴折线图
-                        elif config["type"] == "dual_axis_line":
-                            # 检查所需列是否存在
-                            required_cols = [config["x_axis"]] + config["columns"] + config["right_columns"]
-                            missing_cols = [col for col in required_cols if col not in df.columns]
-                            
-                            if missing_cols:
-                                st.warning(f"缺少列: {', '.join(missing_cols)}")
-                                continue
-                            
-                            # 创建双轴图表
-                            fig = make_subplots(specs=[[{"secondary_y": True}]])
-                            
-                            # 添加左侧Y轴数据
-                            for col in config["columns"]:
-                                fig.add_trace(
-                                    go.Scatter(
-                                        x=df[config["x_axis"]],
-                                        y=df[col],
-                                        name=col,
-                                        mode='lines+markers',
-                                        line=dict(width=2.5)
-                                    ),
-                                    secondary_y=False
-                                )
-                            
-                            # 添加右侧Y轴数据
-                            for col in config["right_columns"]:
-                                fig.add_trace(
-                                    go.Scatter(
-                                        x=df[config["x_axis"]],
-                                        y=df[col],
-                                        name=col,
-                                        mode='lines+markers',
-                                        line=dict(width=2.5, dash='dash')
-                                    ),
-                                    secondary_y=True
-                                )
-                            
-                            # 设置布局
-                            fig.update_layout(
-                                title=chart_name,
-                                xaxis_title=config["x_axis"],
-                                legend_title="指标",
-                                hovermode="x unified",
-                                height=400
-                            )
-                            
-                            # 设置Y轴标题
-                            fig.update_yaxes(
-                                title_text=config.get("left_title", "左侧指标"),
-                                secondary_y=False
-                            )
-                            fig.update_yaxes(
-                                title_text=config.get("right_title", "右侧指标"),
-                                secondary_y=True
-                            )
-                            
-                            st.plotly_chart(fig, use_container_width=True)
+        #折线图
+        if config["type"] == "line":
+            st.line_chart(
+                data=df,
+                x=config["x_axis"],
+                y=config["columns"]
+            )
+            return
+        # 柱状图
+        elif config["type"] == "bar":
+            st.bar_chart(
+                data=df,
+                x=config["x_axis"],
+                y=config["columns"]
+            )
+            return
+        #面积图
+        elif config["type"] == "area":
+            st.area_chart(
+                data=df,
+                x=config["x_axis"],
+                y=config["columns"]
+            )
+            return
+
+        # 所需的列已由图表目录检查过
+        widget_values = ()      # 图表自身控件的取值，作为缓存键的一部分
+        # 饼图
+        if config["type"] == "pie":
+            # 含非数值列的饼图没有预先计算的数据（如导入时未压缩，数值列仍是文本）
+            if chart_name not in self._pie_table(df).compositions:
+                st.warning(f"“{chart_name}”所需的列不全是数值类型，无法绘制饼图")
+                return
+            #让用户选择行（默认为第二行）
+            selected_row = st.selectbox(
+                "选择数据行",
+                options=df["指标名称"],
+                format_func=DataUtils.format_period,
+                key=f"row_select_{chart_name}"
+            )
+            widget_values = (selected_row,)
+
+        if config["type"] not in self.FIGURE_BUILDERS:
+            return
+
+        cache = get_figure_cache()
+        key = cache.make_key(self.data_key, chart_name, widget_values)
+        fig = cache.get(key)
+        if fig is None:
+            fig = getattr(self, self.FIGURE_BUILDERS[config["type"]])(df, chart_name, config, *widget_values)
+            cache.put(key, fig)
+        st.plotly_chart(fig, use_container_width=True)
+
+    def _pie_table(self, df):
+        """当前看板数据的饼图数据表：每个数据版本和时间范围只计算一次"""
+        cache = get_pie_table_cache()
+        table = cache.get(self.data_key)
+        if table is None:
+            schema = self.charts.resolve(df.columns)
+            pie_configs = {name: config for name, config in schema.valid.items() if config["type"] == "pie"}
+            table = PieTable(df, pie_configs)
+            cache.put(self.data_key, table)
+        return table
+
+    # 图表类型 -> 生成Plotly图表的方法
+    FIGURE_BUILDERS = {
+        "scatter": "_scatter_figure",
+        "pie": "_pie_figure",
+        "correlation_heatmap": "_heatmap_figure",
+        "grouped_bar": "_grouped_bar_figure",
+        "dual_axis_line": "_dual_axis_figure"
+    }
+
+    @staticmethod
+    def _scatter_figure(df, chart_name, config):
+        """散点图"""
+        # 把数据重构为长格式
+        return px.scatter(
+            data_frame=df,
+            x=config["x_axis"],
+            y=config["columns"],
+            color="variable",  # 依据原始列名进行颜色区分
+            labels={"value": config["columns"][0],"variable": "数值"}  # 自定义标签
+        )
+
+    def _pie_figure(self, df, chart_name, config, selected_row):
+        """饼图：各部分金额及总额减去各部分后的“其他”（从预先计算的饼图数据表中取值）"""
+        total_value, values, other_value = self._pie_table(df).row(chart_name, selected_row)
+        
+        # 各部分金额
+        part_values = list(values)
+        part_labels = [f"{col} ({value:.2f})" for col, value in zip(config["columns"], part_values)]
+        
+        # "其他"部分
+        if other_value > 0:
+            part_values.append(other_value)
+            part_labels.append(f"其他 ({other_value:.2f})")
+        
+        # 创建饼图
+        fig = px.pie(
+            values=part_values,
+            names=part_labels,
+            title=f"{chart_name}",
+            hover_data=[part_values],
+            hole=0.3  # 中间留空，形成环形图
+        )
+        
+        # 添加总额注释
+        fig.update_layout(
+            annotations=[
+                dict(
+                    text=f'总额: {total_value:.2f}',
+                    showarrow=False,
+                    x=0.5, y=0.5,
+                    font_size=14
+                )
+            ]
+        )
+        return fig
+
+    @staticmethod
+    def _heatmap_figure(df, chart_name, config):
+        """相关性热力图"""
+        available_cols = config["columns"]
+
+        # 计算相关性矩阵
+        correlation_df = df[available_cols].corr()
+        
+        # 创建热力图
+        fig = px.imshow(
+            correlation_df,
+            text_auto=".2f",  # 在单元格中显示两位小数的数值
+            color_continuous_scale="RdBu_r",  # 红蓝对比色，反转以使正相关为蓝色
+            aspect="auto",  # 自动调整宽高比
+            labels=dict(color="相关系数"),
+            zmin=-1,  # 设置最小值为-1
+            zmax=1    # 设置最大值为1
+        )
+        
+        # 设置布局
+        fig.update_layout(
+            xaxis_title="指标",
+            yaxis_title="指标",
+            height=max(400, 100 * len(available_cols)),  # 根据指标数量调整高度
+            width=max(500, 150 * len(available_cols))    # 根据指标数量调整宽度
+        )
+        
+        # 添加自定义悬停文本
+        fig.update_traces(
+            hovertemplate=(
+                "指标1: %{y}<br>" +
+                "指标2: %{x}<br>" +
+                "相关系数: %{z:.3f}<extra></extra>"
+            )
+        )
+        return fig
+        # 箱线图
+        # elif config["type"] == "box":
+        #     fig = px.box(
+        #         df,
+        #         y=config["columns"],
+        #         x=config.get("x_axis", None),
+        #         color=config.get("color_column", None),
+        #         title=chart_name
+        #     )
+        #     st.plotly_chart(fig, use_container_width=True)
+
+    @staticmethod
+    def _grouped_bar_figure(df, chart_name, config):
+        """分组柱状图"""
+        # 准备数据
+        fig = go.Figure()
+        
+        # 颜色设置
+        colors = ['#636EFA', '#EF553B']  # A组和B组颜色
+        
+        # 计算x轴位置
+        x_positions = list(range(len(df[config["x_axis"]].unique())))
+        a_positions = [x - 0.15 for x in x_positions]  # A组向左偏移
+        b_positions = [x + 0.15 for x in x_positions]  # B组向右偏移
+        
+        # 绘制A组柱子
+        fig.add_trace(go.Bar(
+            x=a_positions,
+            y=df[config["columns"][0]],
+            name=config["group_names"][0],
+            marker_color=colors[0],
+            width=0.3,
+            text=df[config["columns"][0]],  # 显示数值标签
+            textposition='outside'
+        ))
+        
+        # 绘制B组柱子
+        fig.add_trace(go.Bar(
+            x=b_positions,
+            y=df[config["columns"][1]],
+            name=config["group_names"][1],
+            marker_color=colors[1],
+            width=0.3,
+            text=df[config["columns"][1]],  # 显示数值标签
+            textposition='outside'
+        ))
+        
+        # 更新布局
+        fig.update_layout(
+            barmode='group',  # 关键设置：分组模式
+            #title=chart_name,
+            xaxis={
+                'tickvals': x_positions,
+                'ticktext': df[config["x_axis"]].unique(),
+                'title': config["x_axis"]
+            },
+            yaxis={'title': '数值'},
+            hovermode='x unified',
+            bargap=0.2,
+            bargroupgap=0.1  # 组内柱子间距
+        )
+        return fig
+
+    @staticmethod
+    def _dual_axis_figure(df, chart_name, config):
+        """双轴折线图"""
+        # 创建双轴图表
+        fig = make_subplots(specs=[[{"secondary_y": True}]])
+        
+        # 添加左侧Y轴数据
+        for col in config["columns"]:
+            fig.add_trace(
+                go.Scatter(
+                    x=df[config["x_axis"]],
+                    y=df[col],
+                    name=col,
+                    mode='lines+markers',
+                    line=dict(width=2.5)
+                ),
+                secondary_y=False
+            )
+        
+        # 添加右侧Y轴数据
+        for col in config["right_columns"]:
+            fig.add_trace(
+                go.Scatter(
+                    x=df[config["x_axis"]],
+                    y=df[col],
+                    name=col,
+                    mode='lines+markers',
+                    line=dict(width=2.5, dash='dash')
+                ),
+                secondary_y=True
+            )
+        
+        # 设置布局
+        fig.update_layout(
+            title=chart_name,
+            xaxis_title=config["x_axis"],
+            legend_title="指标",
+            hovermode="x unified",
+            height=400
+        )
+        
+        # 设置Y轴标题
+        fig.update_yaxes(
+            title_text=config.get("left_title", "左侧指标"),
+            secondary_y=False
+        )
+        fig.update_yaxes(
+            title_text=config.get("right_title", "右侧指标"),
+            secondary_y=True
+        )
+        return fig
 
 #=========================================================================
 # 侧边栏导航
@@ -1306,12 +3595,51 @@ def render_sidebar(state):
         st.subheader("数据状态")
         if state.file_uploaded:
             st.success("数据已加载")
-            if state.raw_df is not None:
-                st.caption(f"原始数据: {state.raw_df.shape[0]}行 × {state.raw_df.shape[1]}列")
-            if state.cleaned_df is not None:
-                st.caption(f"清洗后数据: {state.cleaned_df.shape[0]}行 × {state.cleaned_df.shape[1]}列")
+            # 行列数直接取自列式存储的表结构，侧边栏不加载数据
+            raw_shape = state.raw_shape
+            if raw_shape is not None:
+                st.caption(f"原始数据: {raw_shape[0]}行 × {raw_shape[1]}列")
+            if state.cleaned_version is not None:
+                shared_note = "（与原始数据共享）" if state.cleaned_shared else ""
+                cleaned_shape = raw_shape if state.cleaned_shared else state.cleaned_df.shape
+                st.caption(f"清洗后数据: {cleaned_shape[0]}行 × {cleaned_shape[1]}列{shared_note}")
+                history = state.cleaned_version.history()[1:]
+                if history:
+                    delta_total = sum(version.delta_bytes for version in history)
+                    st.caption(f"清洗版本: {len(history)} 步, 增量共 {delta_total / 1024 ** 2:.2f}MB")
+            if state.raw_dataset_id is not None:
+                share_stats = get_shared_registry().stats(state.raw_dataset_id)
+                st.caption(
+                    f"共享数据集: {share_stats['sessions']} 个会话共用, "
+                    f"节省 {share_stats['saved_bytes'] / 1024 ** 2:.1f}MB 内存"
+                )
         else:
             st.warning("未加载数据")
+
+        # 解析缓存状态
+        cache_stats = get_parse_cache().stats()
+        st.caption(
+            f"解析缓存: 命中 {cache_stats['hits']} 次 / 未命中 {cache_stats['misses']} 次 | "
+            f"{cache_stats['entries']} 个文件, {cache_stats['total_size'] / 1024 ** 2:.1f}MB / "
+            f"{cache_stats['max_size'] / 1024 ** 2:.0f}MB"
+        )
+        figure_stats = get_figure_cache().stats()
+        st.caption(
+            f"图表缓存: 命中 {figure_stats['hits']} 次 / 未命中 {figure_stats['misses']} 次 | "
+            f"{figure_stats['entries']} / {figure_stats['max_size']} 个图表"
+        )
+        export_stats = get_export_cache().stats()
+        st.caption(
+            f"导出缓存: 命中 {export_stats['hits']} 次 / 未命中 {export_stats['misses']} 次 | "
+            f"{export_stats['entries']} 个文件, {export_stats['total_size'] / 1024 ** 2:.1f}MB"
+        )
+        store = get_dataset_store()
+        if store is not None:
+            store_stats = store.stats()
+            st.caption(
+                f"列式存储: {store_stats['datasets']} 个数据集, "
+                f"{store_stats['file_bytes'] / 1024 ** 2:.1f}MB（内存映射，各会话共享）"
+            )
         
         # 重置按钮
         if st.button("重置所有数据", use_container_width=True, type="secondary"):
@@ -0,0 +1,116 @@
+"""批量清洗：不经过浏览器，按清洗配方并行处理一个目录下的月报文件
+
+配方为JSON文件，例如:
+    {
+        "import": {"compact": true},
+        "steps": [
+            {"op": "drop_duplicates"},
+            {"op": "drop_periods", "params": {"periods": "2015"}},
+            {"op": "impute", "params": {"numeric": "linear"}}
+        ],
+        "export": {"format": "Parquet", "options": {"compression": "zstd"}}
+    }
+
+用法:
+    python batch_clean.py 输入目录 配方.json --output-dir 输出目录 --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app_copy2jiahu import DEFAULT_IMPORT_OPTIONS, CleaningPipeline, DataExporter, parse_upload
+
+INPUT_EXTENSIONS = (".csv", ".xlsx", ".xls")
+
+
+def _clean_file(path, recipe, output_dir):
+    """在子进程中处理单个文件：导入 -> 按配方清洗 -> 导出，返回该文件的报告"""
+    name = os.path.basename(path)
+    report = {"文件": name}
+    try:
+        # 配方未指定的解析参数与界面的默认值一致（压缩数据类型）
+        import_options = {**DEFAULT_IMPORT_OPTIONS, **recipe.get("import", {})}
+        with open(path, "rb") as f:
+            df, elapsed = parse_upload(name, f.read(), import_options)
+        if df is None:
+            raise ValueError("无法解析文件")
+        report["导入(秒)"] = round(elapsed, 3)
+        report["导入行数"] = len(df)
+
+        start = time.perf_counter()
+        # 一次执行全部步骤，不保留中间版本
+        pipeline = CleaningPipeline.from_dict(recipe)
+        cleaned, step_stats = pipeline.replay(df)
+        report["清洗(秒)"] = round(time.perf_counter() - start, 3)
+        report["清洗后行数"] = len(cleaned)
+        report["步骤"] = [{"操作": step.label, **stats} for step, stats in zip(pipeline.steps, step_stats)]
+
+        start = time.perf_counter()
+        export = recipe.get("export", {})
+        export_format = export.get("format", "CSV")
+        options = export.get("options", {})
+        extension, _ = DataExporter.file_info(export_format, options)
+        output_path = os.path.join(output_dir, os.path.splitext(name)[0] + extension)
+        with open(output_path, "wb") as f:
+            DataExporter.write(cleaned, export_format, f, options)
+        report["导出(秒)"] = round(time.perf_counter() - start, 3)
+        report["输出"] = output_path
+        report["状态"] = "成功"
+    except Exception as e:
+        # 单个文件失败不影响其余文件
+        report["状态"] = "失败"
+        report["错误"] = f"{type(e).__name__}: {e}"
+    return report
+
+
+def run_batch(input_dir, recipe, output_dir, workers=None):
+    """并行处理目录下的所有文件，返回(各文件报告, 总耗时)"""
+    paths = sorted(
+        os.path.join(input_dir, name) for name in os.listdir(input_dir)
+        if name.lower().endswith(INPUT_EXTENSIONS)
+    )
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    reports = []
+    with ProcessPoolExecutor(max_workers=min(len(paths), workers or os.cpu_count() or 1) or 1) as executor:
+        futures = [executor.submit(_clean_file, path, recipe, output_dir) for path in paths]
+        for done, future in enumerate(as_completed(futures), start=1):
+            report = future.result()
+            reports.append(report)
+            print(f"[{done}/{len(paths)}] {report['文件']}: {report['状态']}"
+                  + (f" ({report['错误']})" if report["状态"] == "失败" else ""), flush=True)
+    reports.sort(key=lambda r: r["文件"])
+    return reports, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按清洗配方批量处理月报文件")
+    parser.add_argument("input_dir", help="输入文件目录（CSV/Excel）")
+    parser.add_argument("recipe", help="清洗配方JSON文件")
+    parser.add_argument("--output-dir", default="cleaned", help="输出目录")
+    parser.add_argument("--workers", type=int, default=None, help="并行进程数，默认等于CPU核数")
+    parser.add_argument("--format", choices=list(DataExporter.FORMATS), help="覆盖配方中的导出格式")
+    args = parser.parse_args()
+
+    with open(args.recipe, encoding="utf-8") as f:
+        recipe = json.load(f)
+    if args.format:
+        recipe["export"] = {"format": args.format, "options": {}}
+
+    reports, elapsed = run_batch(args.input_dir, recipe, args.output_dir, args.workers)
+
+    # 耗时报告
+    report_path = os.path.join(args.output_dir, "report.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"总耗时(秒)": round(elapsed, 3), "文件": reports}, f, ensure_ascii=False, indent=2, default=str)
+    failed = [r for r in reports if r["状态"] == "失败"]
+    print(f"共 {len(reports)} 个文件, 失败 {len(failed)} 个, 总耗时 {elapsed:.2f}s, 报告: {report_path}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""性能基准脚本
+
+用法:
+    python benchmarks.py excel --rows 50000 --cols 200
+    python benchmarks.py export --rows 200000 --cols 50
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from app_copy2jiahu import DataExporter, ExcelReader
+
+
+class _NamedFile:
+    """模拟Streamlit的UploadedFile（带name属性的文件对象）"""
+    def __init__(self, path):
+        self.name = path
+        self._fh = open(path, 'rb')
+
+    def __getattr__(self, item):
+        return getattr(self._fh, item)
+
+
+def _write_workbook(path, rows, cols):
+    """生成与统计月报相同结构的工作簿：表头、计量单位行、代码行和数值行"""
+    import openpyxl
+
+    rng = np.random.default_rng(0)
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("月报")
+    sheet.append(["指标名称"] + [f"指标{i}" for i in range(cols)])
+    sheet.append(["计量单位"] + ["亿元"] * cols)
+    sheet.append(["代码"] + [f"A{i:03d}" for i in range(cols)])
+    values = rng.uniform(0, 10000, size=(rows, cols)).round(2)
+    for i in range(rows):
+        sheet.append([42005 + 30 * i] + values[i].tolist())
+    workbook.create_sheet("说明").append(["本工作簿由benchmarks.py生成"])
+    workbook.save(path)
+
+
+def bench_excel(rows, cols):
+    """对比各Excel读取后端读取工作表目录和解析单个工作表的耗时"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "bench.xlsx")
+        start = time.perf_counter()
+        _write_workbook(path, rows, cols)
+        print(f"生成工作簿 {rows}行 × {cols + 1}列: {time.perf_counter() - start:.2f}s, "
+              f"{os.path.getsize(path) / 1024 ** 2:.1f}MB")
+
+        for backend in ExcelReader.available_backends():
+            f = _NamedFile(path)
+            try:
+                start = time.perf_counter()
+                sheets = ExcelReader.sheet_names(f, backend=backend)
+                list_time = time.perf_counter() - start
+
+                start = time.perf_counter()
+                df = ExcelReader.read_sheet(f, sheet_name=sheets[0], backend=backend)
+                read_time = time.perf_counter() - start
+            finally:
+                f.close()
+            print(f"{backend:>10}: 读取工作表目录 {list_time * 1000:.1f}ms, "
+                  f"解析工作表 {read_time:.2f}s ({df.shape[0]}行 × {df.shape[1]}列)")
+
+
+def _indicator_frame(rows, cols):
+    """与清洗后的月报相同结构的数据：月度指标名称、float32指标列（含缺失值）和一个分类列"""
+    rng = np.random.default_rng(0)
+    values = rng.uniform(0, 10000, size=(rows, cols)).round(2).astype(np.float32)
+    values[rng.random((rows, cols)) < 0.05] = np.nan
+    df = pd.DataFrame(values, columns=[f"指标{i}" for i in range(cols)])
+    df.insert(0, "指标名称", pd.period_range("1000-01", periods=rows, freq="M"))
+    df["地区"] = pd.Categorical(rng.choice(["东部", "中部", "西部", "东北"], rows))
+    return df
+
+
+def _read_back(path, export_format, options):
+    """按下游的方式读回导出文件"""
+    if export_format == "CSV":
+        return pd.read_csv(path, compression="gzip" if options.get("gzip") else None)
+    if export_format == "Excel":
+        return pd.read_excel(path)
+    if export_format == "Parquet":
+        return pd.read_parquet(path)
+    return pd.read_feather(path)
+
+
+def bench_export(rows, cols, excel_rows):
+    """对比各导出格式的写入耗时、文件大小、读回耗时以及读回后是否保留列类型"""
+    df = _indicator_frame(rows, cols)
+    print(f"数据 {rows}行 × {df.shape[1]}列, 内存 {df.memory_usage(deep=True).sum() / 1024 ** 2:.1f}MB"
+          f"（Excel只取前{excel_rows}行）")
+
+    cases = [("CSV", {}), ("CSV", {"gzip": True}), ("Excel", {})]
+    cases += [("Parquet", {"compression": c}) for c in ("snappy", "zstd")]
+    cases += [("Feather", {}), ("Arrow IPC", {})]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for export_format, options in cases:
+            if export_format not in DataExporter.available_formats():
+                continue
+            data = df.head(excel_rows) if export_format == "Excel" else df
+            extension, _ = DataExporter.file_info(export_format, options)
+            path = os.path.join(tmp_dir, "bench" + extension)
+
+            start = time.perf_counter()
+            with open(path, "wb") as f:
+                DataExporter.write(data, export_format, f, options)
+            write_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            back = _read_back(path, export_format, options)
+            read_time = time.perf_counter() - start
+
+            label = export_format + "".join(f" {k}={v}" for k, v in options.items())
+            print(f"{label:>26}: 写入 {write_time:.2f}s, {os.path.getsize(path) / 1024 ** 2:.1f}MB, "
+                  f"读回 {read_time:.2f}s, 类型{'保留' if back.dtypes.equals(data.dtypes) else '丢失'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="性能基准")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    excel = sub.add_parser("excel", help="对比Excel读取后端")
+    excel.add_argument("--rows", type=int, default=50000)
+    excel.add_argument("--cols", type=int, default=200)
+
+    export = sub.add_parser("export", help="对比导出格式")
+    export.add_argument("--rows", type=int, default=200000)
+    export.add_argument("--cols", type=int, default=50)
+    export.add_argument("--excel-rows", type=int, default=20000, help="Excel导出较慢，只取前N行")
+
+    args = parser.parse_args()
+    if args.bench == "excel":
+        bench_excel(args.rows, args.cols)
+    elif args.bench == "export":
+        bench_export(args.rows, args.cols, args.excel_rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app_copy2jiahu import CleaningOps
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "工业 增加值": [1.0, -2.0, np.nan, 4.0],
+        "出口额": [10, 20, 30, 40],
+    })
+
+
+def test_drop_where_keeps_rows_not_matching(df):
+    delta, stats = CleaningOps.drop_where(df, {"expr": "`工业 增加值` < 0 or `工业 增加值`.isna()"})
+    assert delta["row_mask"].tolist() == [True, False, False, True]
+    assert stats == {"removed": 2}
+
+
+def test_drop_where_supports_bare_names_and_arithmetic(df):
+    delta, _ = CleaningOps.drop_where(df, {"expr": "出口额 * 2 >= 60 and not 出口额 in [40]"})
+    assert delta["row_mask"].tolist() == [True, True, False, True]
+
+
+def test_drop_where_rejects_local_variables(df, tmp_path):
+    target = tmp_path / "created"
+    with pytest.raises(ValueError):
+        CleaningOps.drop_where(df, {"expr": f"@os.makedirs('{target}')"})
+    assert not target.exists()
+
+
+@pytest.mark.parametrize("expr", [
+    "出口额.__class__",
+    "`出口额`.abs() > 1",
+    "__import__('os')",
+    "出口额 > 其他变量",
+    "(lambda: 1)() == 1",
+])
+def test_drop_where_rejects_other_syntax(df, expr):
+    with pytest.raises(ValueError):
+        CleaningOps.drop_where(df, {"expr": expr})